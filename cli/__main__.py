@@ -1,10 +1,17 @@
+import sys
 from cli.core.config import Config
-from cli.command.main import noj
+from cli.command.noj import noj
 
 
 def main():
     Config.load()
-    noj()
+    try:
+        noj()
+    finally:
+        # Only close the session if any command has used it
+        auth = sys.modules.get('cli.core.auth')
+        if auth is not None:
+            auth.close_session()
 
 
 if __name__ == '__main__':
@@ -1,7 +1,11 @@
-from typing import Tuple
+import pathlib
+from typing import Dict, Optional, Tuple
 import click
-from cli.core import Config, Course
+from cli.core import Course
+from cli.core import similarity, util
 from cli.core.auth import logined_session
+from cli.core.copycat import CopycatReport
+from cli.core.submission import infer_language
 
 
 @click.group()
@@ -25,18 +29,8 @@ def generate(pid: Tuple[int], course: str):
     Generate copycat report
     '''
     course = Course.get_by_name(course)
-    students = {s.username: s.username for s in course.students}
-    with logined_session() as sess:
-        for i in pid:
-            resp = sess.post(
-                f'{Config.API_BASE}/copycat',
-                json={
-                    'course': course.name,
-                    'problemId': i,
-                    'studentNicknames': students,
-                },
-            )
-            assert resp.ok, resp.text
+    for i in pid:
+        CopycatReport.request(course, i)
 
 
 @copycat.command()
@@ -54,19 +48,230 @@ def get(pid: Tuple[int], course: str):
     '''
     urls = {}
     course = Course.get_by_name(course)
-    with logined_session() as sess:
-        for i in pid:
-            resp = sess.get(
-                f'{Config.API_BASE}/copycat',
-                params={
-                    'course': course.name,
-                    'problemId': i,
-                },
-            )
-            assert resp.ok, resp.text
-            try:
-                urls[i] = resp.json()['data']['cpp_report']
-            except KeyError:
-                print(resp.json())
-                raise
+    for i in pid:
+        try:
+            urls[i] = CopycatReport.get(course.name, i).cpp_report
+        except ValueError as e:
+            print(e)
+            exit(1)
     print(urls)
+
+
+@copycat.command()
+@click.option(
+    '-p',
+    '--pid',
+    type=int,
+    multiple=True,
+    required=True,
+    help='Problem IDs that need to check',
+)
+@click.option('-c', '--course', required=True)
+@click.option(
+    '-j',
+    '--jobs',
+    help='Number of concurrent requests',
+    type=click.IntRange(min=1),
+    default=8,
+)
+@click.option(
+    '--timeout',
+    help='Seconds to wait for the reports',
+    type=click.FloatRange(min=0),
+    default=600,
+)
+@click.option(
+    '-o',
+    '--output',
+    help='Download report pages to this directory',
+    type=click.Path(file_okay=False, path_type=pathlib.Path),
+)
+def run(
+    pid: Tuple[int],
+    course: str,
+    jobs: int,
+    timeout: float,
+    output: Optional[pathlib.Path],
+):
+    '''
+    Generate copycat reports and wait for them
+    '''
+    course = Course.get_by_name(course)
+    logined_session().resize_pool(jobs)
+    # pid -> status
+    status = {i: 'Timeout' for i in pid}
+
+    def request(i: int) -> CopycatReport:
+        # Reports of the last run are served until new ones are generated
+        previous = CopycatReport.get(course.name, i)
+        CopycatReport.request(course, i)
+        return previous
+
+    previous = {}
+    results = util.concurrent_map(request, pid, jobs=jobs)
+    for i, report, error in results:
+        if error is not None:
+            status[i] = f'Request failed: {error!r}'
+        else:
+            previous[i] = report
+    print(f'Requested {len(previous)} reports, waiting for them.')
+    reports, _ = CopycatReport.wait_all(
+        course.name,
+        [*previous],
+        jobs=jobs,
+        timeout=timeout,
+        previous=previous,
+    )
+    for i in reports:
+        status[i] = 'OK'
+    if output is not None and reports:
+        output.mkdir(parents=True, exist_ok=True)
+        pages = [(r, lang) for r in reports.values() for lang in r.urls()]
+        downloads = util.concurrent_map(
+            lambda page: page[0].download(page[1]),
+            pages,
+            jobs=jobs,
+            retry=2,
+        )
+        for (report, lang), content, error in downloads:
+            if error is not None:
+                status[report.problem_id] = f'Download failed: {error!r}'
+                continue
+            (output / f'{report.problem_id}-{lang}.html').write_bytes(content)
+    rows = []
+    for i in pid:
+        report = reports.get(i, CopycatReport(i))
+        rows.append((
+            i,
+            status[i],
+            report.cpp_report or '-',
+            report.python_report or '-',
+        ))
+    print(
+        util.format_table(
+            ['PROBLEM', 'STATUS', 'CPP REPORT', 'PYTHON REPORT'],
+            rows,
+        ))
+    if any(s != 'OK' for s in status.values()):
+        exit(1)
+
+
+@copycat.command()
+@click.argument(
+    'directory',
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, file_okay=False, path_type=pathlib.Path),
+)
+@click.option(
+    '-k',
+    help='Tokens in a k-gram',
+    type=click.IntRange(min=1),
+    default=5,
+)
+@click.option(
+    '-w',
+    '--window',
+    help='Winnowing window size',
+    type=click.IntRange(min=1),
+    default=4,
+)
+@click.option(
+    '-j',
+    '--jobs',
+    help='Number of processes, default to the number of CPUs',
+    type=click.IntRange(min=1),
+)
+@click.option(
+    '-n',
+    '--top',
+    help='Number of pairs to show',
+    type=click.IntRange(min=0),
+    default=50,
+)
+@click.option(
+    '--min-similarity',
+    help='Only show pairs at least this similar',
+    type=float,
+    default=0.5,
+)
+@click.option(
+    '--max-df',
+    help='Do not pair students by fragments shared by more than this ratio '
+    'of them',
+    type=float,
+    default=0.05,
+)
+@click.option(
+    '--pycparser',
+    help='Tokenize C sources by pycparser',
+    is_flag=True,
+)
+def local(
+    directory: Tuple[pathlib.Path],
+    k: int,
+    window: int,
+    jobs: Optional[int],
+    top: int,
+    min_similarity: float,
+    max_df: float,
+    pycparser: bool,
+):
+    '''
+    Find similar code downloaded by `submission get-problem-code`
+
+    Each DIRECTORY contains <username>/<id>.<ext> of a problem, and the
+    latest submission of each student is compared.
+    '''
+    # problem directory -> username -> source file
+    latest: Dict[pathlib.Path, Dict[str, pathlib.Path]] = {}
+    for d in directory:
+        latest[d] = {}
+        for user_dir in sorted(p for p in d.iterdir() if p.is_dir()):
+            sources = []
+            for path in user_dir.iterdir():
+                try:
+                    infer_language(path.name)
+                except ValueError:
+                    continue
+                sources.append(path)
+            if sources:
+                # Submission ids are increasing
+                latest[d][user_dir.name] = max(sources, key=lambda p: p.stem)
+    paths = [p for users in latest.values() for p in users.values()]
+    if len(paths) == 0:
+        print('No source file found')
+        exit(1)
+    try:
+        fingerprints = similarity.fingerprint_files(
+            paths,
+            k,
+            window,
+            jobs,
+            pycparser,
+        )
+    except ImportError as e:
+        print(e)
+        exit(1)
+    rows = []
+    for d, users in latest.items():
+        index = similarity.SimilarityIndex()
+        for username, path in users.items():
+            index.add(username, fingerprints[path])
+        for a, b, shared, score in index.pairs(max_df, min_similarity):
+            rows.append((
+                d.name,
+                a,
+                b,
+                f'{score:.0%}',
+                shared,
+                users[a].name,
+                users[b].name,
+                score,
+            ))
+    rows.sort(key=lambda r: (-r[-1], -r[4]))
+    print(
+        util.format_table(
+            ['PROBLEM', 'USER A', 'USER B', 'SIMILARITY', 'SHARED', 'A', 'B'],
+            (r[:-1] for r in rows[:top]),
+        ))
@@ -7,7 +7,9 @@ __all__ = ('homework', )
 
 @click.group()
 def homework():
-    pass
+    '''
+    Homework API
+    '''
 
 
 @homework.command()
@@ -1,17 +1,22 @@
 import json
 import logging
-from typing import Optional
+import ipaddress
+from typing import Dict, List, Optional, Tuple
 from cli.core import (
     Homework,
     Config,
 )
+from cli.core import util
 from cli.core.auth import logined_session
+from cli.core.metacache import MetadataCache
 import click
 
 
 @click.group()
 def ip_filter():
-    pass
+    '''
+    Homework IP filter API
+    '''
 
 
 def patch(
@@ -27,18 +32,63 @@ def patch(
         hw = Homework.get_by_name(course, name)
     else:
         raise ValueError('Option error, either id or name should be provided.')
+    if not send_patches(course, hw, [{'op': op, 'value': ip}]):
+        exit(1)
+
+
+def send_patches(
+    course: str,
+    hw: Homework,
+    patches: List[Dict[str, str]],
+) -> bool:
+    '''
+    Apply all patches to homework's ip filters in one request
+    '''
     with logined_session() as sess:
         url = f'{Config.API_BASE}/homework/{course}/{hw.name}/ip-filters'
-        resp = sess.patch(
-            url,
-            json={'patches': [{
-                'op': op,
-                'value': ip,
-            }]},
-        )
+        resp = sess.patch(url, json={'patches': patches})
         logging.debug(resp.text)
-        if resp.status_code != 200:
-            exit(1)
+    # Cached homework payloads may contain the old filters
+    MetadataCache.invalidate(f'{Config.API_BASE}/homework/{hw.id}')
+    MetadataCache.invalidate(f'{Config.API_BASE}/course/{course}/homework')
+    return resp.status_code == 200
+
+
+def get_ip_filters(course: str, hw: Homework) -> List[str]:
+    with logined_session() as sess:
+        url = f'{Config.API_BASE}/homework/{course}/{hw.name}/ip-filters'
+        resp = sess.get(url)
+        assert resp.ok, resp.text
+    return resp.json()['data']['ipFilters']
+
+
+def normalize_ip(ip: str) -> str:
+    try:
+        return str(ipaddress.ip_network(ip, strict=False))
+    except ValueError:
+        return ip
+
+
+def diff_ip_filters(
+    current: List[str],
+    desired: List[str],
+) -> List[Dict[str, str]]:
+    '''
+    Patches turning `current` into `desired`, entries are compared in their
+    normalized CIDR form
+    '''
+    current = {normalize_ip(ip): ip for ip in current}
+    desired = {normalize_ip(ip): ip for ip in desired}
+    return [
+        *({
+            'op': 'del',
+            'value': ip,
+        } for key, ip in current.items() if key not in desired),
+        *({
+            'op': 'add',
+            'value': ip,
+        } for key, ip in desired.items() if key not in current),
+    ]
 
 
 @ip_filter.command()
@@ -102,3 +152,74 @@ def get(
         url = f'{Config.API_BASE}/homework/{course}/{hw.name}/ip-filters'
         ip_filters = sess.get(url).json()['data']['ipFilters']
     print(json.dumps(ip_filters))
+
+
+@ip_filter.command()
+@click.option(
+    '-c',
+    '--course',
+    help='Course name',
+    required=True,
+)
+@click.option(
+    '-j',
+    '--jobs',
+    help='Number of homeworks updated concurrently',
+    type=click.IntRange(min=1),
+    default=8,
+)
+@click.option(
+    '--dry-run',
+    help='Only print the patches',
+    is_flag=True,
+)
+@click.argument('file', type=click.File())
+def apply(
+    course: str,
+    jobs: int,
+    dry_run: bool,
+    file,
+):
+    '''
+    Make homeworks' ip filters match FILE
+
+    FILE is a JSON object mapping homework name to its list of IP filters,
+    e.g. {"hw1": ["140.122.0.0/16"]}. Each homework is updated by at most
+    one request.
+    '''
+    desired: Dict[str, List[str]] = json.load(file)
+    for name, ips in desired.items():
+        for ip in ips:
+            # Reject typos before anything is sent
+            try:
+                ipaddress.ip_network(ip, strict=False)
+            except ValueError as e:
+                print(f'{name}: {e}')
+                exit(1)
+    logined_session().resize_pool(jobs)
+
+    def update(name: str) -> Tuple[int, int]:
+        hw = Homework.get_by_name(course, name)
+        patches = diff_ip_filters(get_ip_filters(course, hw), desired[name])
+        if dry_run:
+            for p in patches:
+                print(f'{name}: {p["op"]} {p["value"]}')
+        elif patches and not send_patches(course, hw, patches):
+            raise RuntimeError('Patch failed')
+        return (
+            sum(p['op'] == 'add' for p in patches),
+            sum(p['op'] == 'del' for p in patches),
+        )
+
+    rows = []
+    failed = False
+    for name, counts, error in util.concurrent_map(update, desired, jobs):
+        if error is not None:
+            failed = True
+            rows.append((name, '-', '-', repr(error)))
+        else:
+            rows.append((name, *counts, 'OK'))
+    rows.sort()
+    print(util.format_table(['HOMEWORK', 'ADD', 'DELETE', 'STATUS'], rows))
+    if failed:
+        exit(1)
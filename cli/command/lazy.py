@@ -0,0 +1,56 @@
+import importlib
+from typing import Dict, List, Optional, Tuple
+import click
+
+__all__ = ('LazyGroup', )
+
+
+class LazyGroup(click.Group):
+    '''
+    Click group whose sub-commands are imported only when invoked.
+
+    `lazy_commands` maps command name to `('<module>:<attr>', short_help)`,
+    the short help is shown by `--help` without importing the command.
+    '''
+
+    def __init__(
+        self,
+        *args,
+        lazy_commands: Optional[Dict[str, Tuple[str, str]]] = None,
+        **ks,
+    ) -> None:
+        super().__init__(*args, **ks)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted({*super().list_commands(ctx), *self.lazy_commands})
+
+    def get_command(
+        self,
+        ctx: click.Context,
+        cmd_name: str,
+    ) -> Optional[click.Command]:
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            path, _ = self.lazy_commands[cmd_name]
+            module, attr = path.split(':')
+            cmd = getattr(importlib.import_module(module), attr)
+            self.add_command(cmd, cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(
+        self,
+        ctx: click.Context,
+        formatter: click.HelpFormatter,
+    ) -> None:
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                cmd = self.commands[name]
+                if cmd.hidden:
+                    continue
+                rows.append((name, cmd.get_short_help_str()))
+            else:
+                rows.append((name, self.lazy_commands[name][1]))
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
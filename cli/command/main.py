@@ -13,11 +13,16 @@ from typing import (
 
 from cli.core import (
     Submission,
+    SubmissionBatch,
     Config,
     MultiDeadLinePolicy,
     Homework,
 )
 from cli.core import util
+from cli.core.auth import logined_session
+from cli.core.cache import SubmissionCache
+from cli.core.journal import CheckpointJournal
+from cli.core.scheduler import RejudgeScheduler
 from cli.command.noj import noj
 import click
 
@@ -69,6 +74,13 @@ import click
           'If this option is not set, the weights are equally distributed.\n'),
     multiple=True,
 )
+@click.option(
+    '-j',
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=8,
+    help='Number of problems whose submissions are fetched concurrently.',
+)
 def grade(
     pid: Optional[Tuple[int]],
     homework: Optional[str],
@@ -76,6 +88,7 @@ def grade(
     output: pathlib.Path,
     exclude: Optional[str],
     weight: Tuple[str],
+    jobs: int,
 ):
     '''
     Generate score file
@@ -134,7 +147,21 @@ def grade(
         logging.debug(f'Weights: {weight}')
     logging.debug(f'Deadline: {deadline}')
     logging.debug(f'Exclude list: {exclude}')
-    submissions = [*chain(*(Submission.filter(problem_id=i) for i in pid))]
+    jobs = min(jobs, max(len(pid), 1))
+    logined_session().resize_pool(jobs)
+
+    def fetch_problem(i: int) -> SubmissionBatch:
+        return SubmissionBatch.from_submissions(
+            Submission.iter_filter(problem_id=i, cached=True))
+
+    # Collect each problem as soon as it arrives
+    submissions = SubmissionBatch()
+    results = util.concurrent_map(fetch_problem, pid, jobs=jobs)
+    for i, batch, error in results:
+        if error is not None:
+            raise error
+        logging.debug(f'Got {len(batch)} submissions of {i}')
+        submissions.extend(batch)
     policy = MultiDeadLinePolicy(
         submissions,
         students=students,
@@ -163,47 +190,128 @@ def grade(
         path_type=pathlib.Path,
     ),
 )
+@click.option(
+    '-j',
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=10,
+    help='Max number of submissions being rejudged at the same time.',
+)
+@click.option(
+    '--rate',
+    type=click.FloatRange(min=0, min_open=True),
+    default=5,
+    help='Max rejudge requests sent per second.',
+)
+@click.option(
+    '--timeout',
+    type=click.FloatRange(min=0),
+    default=300,
+    help='Seconds to wait for the result of each submission.',
+)
 def rejudge(
     pid: Tuple[int],
     file: Optional[pathlib.Path],
+    jobs: int,
+    rate: float,
+    timeout: float,
 ):
     '''
     Rejudge submissions by problem id
     '''
     logging.debug(f'Rejudge for problems: {pid}')
+    scheduler = RejudgeScheduler(
+        concurrency=jobs,
+        rate=rate,
+        timeout=timeout,
+    )
     if file is not None:
-        submission_ids = json.load(file.open('r'))
-        fails = []
-        submissions = map(Submission.get_by_id, submission_ids[:])
-        for chunk in util.chunker_list(submissions, 10):
-            for i, s in enumerate(chunk):
-                json.dump(
-                    fails + submission_ids,
-                    file.open('w'),
-                )
-                if s.status == -2:
+        with file.open() as f:
+            submission_ids = json.load(f)
+        # Progress is appended to the journal, and the input file is only
+        # rewritten once all submissions are finished
+        journal = CheckpointJournal(file.with_name(f'{file.name}.journal'))
+        finished = journal.replay()
+        if finished:
+            print(f'Resume from {journal.path}, '
+                  f'{len(finished)} submissions are finished.')
+        remaining = [i for i in submission_ids if i not in finished]
+        logined_session().resize_pool(jobs)
+        missing = {}
+
+        def fetched():
+            lookups = Submission.get_many(remaining, jobs=jobs, retry=2)
+            for _id, s, error in lookups:
+                if error is not None:
+                    missing[_id] = repr(error)
+                    journal.record(_id, repr(error))
                     continue
-                try:
-                    s.rejudge(interval=5)
-                except RuntimeError as e:
-                    logging.debug(f'Fail at {s.id}: {e}')
-                    fails.append(s.id)
-                submission_ids.remove(s.id)
+                yield s
+
+        with journal:
+            summary = scheduler.run(fetched(), on_done=journal.record)
+        summary.failed.update(missing)
+        print(summary)
+        # Keep failed ones for the next run
+        fails = [i for i, e in journal.replay().items() if e is not None]
+        util.atomic_write_text(file, json.dumps(fails))
+        journal.remove()
         return
-    for i in pid:
+
+    def problem_submissions(i: int):
         logging.debug(f'Start rejudge problem {i}')
         # Get submissions by problem id
-        submissions = Submission.filter(problem_id=i)
-        logging.debug(f'Found {len(submissions)} submissions')
-        fails = []
-        for chunk in util.chunker_list(submissions, 10):
-            for i, s in enumerate(chunk):
-                if s.status == -2:
-                    continue
-                s.rejudge(interval=5)
-        if fails:
-            logging.debug(f'Failed submissions for {i}')
-            logging.debug(f'{[s.id for s in fails]}')
+        return Submission.iter_filter(problem_id=i)
+
+    # Share one scheduler across problems to keep it busy
+    summary = scheduler.run(chain.from_iterable(map(problem_submissions, pid)))
+    print(summary)
+
+
+@noj.command()
+@click.option(
+    '-c',
+    '--course',
+    help='Course to sync',
+    multiple=True,
+)
+@click.option(
+    '-p',
+    '--pid',
+    help='Problem ID to sync',
+    type=int,
+    multiple=True,
+)
+@click.option(
+    '--full',
+    help='Fetch all submissions instead of the ones after last sync',
+    is_flag=True,
+)
+def sync(
+    course: Tuple[str],
+    pid: Tuple[int],
+    full: bool,
+):
+    '''
+    Sync submissions to local cache
+
+    Once synced, submission queries of the course or problem are answered
+    locally for `submission_cache_ttl` seconds (600 by default), unless
+    `--refresh` is given.
+    '''
+    if len(course) == 0 and len(pid) == 0:
+        print('Either course or pid must be given')
+        exit(1)
+    if not Config.PERSIST:
+        print('Local cache is not used with environment credentials')
+        exit(1)
+    with SubmissionCache() as cache:
+        for c in course:
+            count = cache.sync(course=c, full=full)
+            print(f'Course {c}: {count} submissions synced')
+        for i in pid:
+            count = cache.sync(problem_id=i, full=full)
+            print(f'Problem {i}: {count} submissions synced')
 
 
 # TODO: seperate this from main.py
@@ -218,6 +326,9 @@ def add_student(
     student: List[str],
     ta: List[str],
 ):
+    '''
+    Add students and TAs to a course
+    '''
     from cli.core.auth import logined_session
     students = {s: s for s in student}
     with logined_session() as sess:
@@ -1,34 +1,79 @@
 import click
 import logging
-from .submission import submission
-from .ip_filter import ip_filter
-from .user import user
-from .homework import homework
-from .copycat import copycat
-from .problem import problem
+from typing import Optional, TextIO
+from .lazy import LazyGroup
 
 
-@click.group()
+@click.group(
+    cls=LazyGroup,
+    lazy_commands={
+        'submission': ('cli.command.submission:submission', 'Submission API'),
+        'ip-filter': (
+            'cli.command.ip_filter:ip_filter',
+            'Homework IP filter API',
+        ),
+        'user': ('cli.command.user:user', 'User API'),
+        'homework': ('cli.command.homework:homework', 'Homework API'),
+        'copycat': ('cli.command.copycat:copycat', 'Copycat API'),
+        'problem': ('cli.command.problem:problem', 'Problem API'),
+        'grade': ('cli.command.main:grade', 'Generate score file'),
+        'rejudge': (
+            'cli.command.main:rejudge',
+            'Rejudge submissions by problem id',
+        ),
+        'sync': ('cli.command.main:sync', 'Sync submissions to local cache'),
+        'add-student': (
+            'cli.command.main:add_student',
+            'Add students and TAs to a course',
+        ),
+    },
+)
 @click.option(
     '--debug',
     help='Enable debug',
     is_flag=True,
 )
-def noj(debug: bool):
+@click.option(
+    '--refresh',
+    help='Query the API even if submissions or metadata are cached',
+    is_flag=True,
+)
+@click.option(
+    '--trace',
+    help='Write a JSON line for each API request to this file',
+    type=click.File('w'),
+)
+@click.option(
+    '--stats',
+    help='Print latency percentiles of each API endpoint at exit',
+    is_flag=True,
+)
+@click.pass_context
+def noj(
+    ctx: click.Context,
+    debug: bool,
+    refresh: bool,
+    trace: Optional[TextIO],
+    stats: bool,
+):
     '''
     CLI tool for interacting with Normal OJ API
     '''
     if debug:
         logging.basicConfig(level=logging.DEBUG)
+    if refresh:
+        from cli.core.cache import SubmissionCache
+        from cli.core.config import Config
+        SubmissionCache.enabled = False
+        # Revalidate cached homework, course and problem data
+        Config.METADATA_TTL = 0
+    if trace is not None or stats:
+        from cli.core.trace import Tracer
+        tracer = Tracer.current = Tracer(trace)
 
+        def finish():
+            tracer.close()
+            if stats:
+                click.echo(tracer.report(), err=True)
 
-sub_commands = (
-    submission,
-    ip_filter,
-    user,
-    homework,
-    copycat,
-    problem,
-)
-for cmd in sub_commands:
-    noj.add_command(cmd)
\ No newline at end of file
+        ctx.call_on_close(finish)
@@ -8,7 +8,9 @@ __all__ = ('problem', )
 
 @click.group()
 def problem():
-    pass
+    '''
+    Problem API
+    '''
 
 
 @problem.command
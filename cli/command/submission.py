@@ -1,16 +1,21 @@
 import click
+import glob
 import pathlib
 import json
 import sys
 from functools import partial
+from itertools import chain
 from datetime import datetime
 from typing import (
     Tuple,
     Optional,
 )
 from tqdm import tqdm
-from cli.core import Submission
-from cli.core.submission import LanguageType
+from cli.core import Submission, SubmissionBatch, util
+from cli.core.auth import logined_session
+from cli.core.manifest import CodeManifest
+from cli.core.scheduler import StatusPoller
+from cli.core.submission import SubmissionStatus
 from cli.core import submission as submission_lib
 
 __all__ = ('submission', )
@@ -18,7 +23,9 @@ __all__ = ('submission', )
 
 @click.group()
 def submission():
-    pass
+    '''
+    Submission API
+    '''
 
 
 @submission.command()
@@ -70,6 +77,14 @@ def get(id):
     '-b',
     '--before',
 )
+@click.option(
+    '--format',
+    'fmt',
+    type=click.Choice(['json', 'jsonl']),
+    default='json',
+    help=('Output a JSON array, or JSON Lines written as soon as '
+          'each submission is received.'),
+)
 def get_list(
     pid: Tuple[int],
     output: Optional[pathlib.Path],
@@ -78,6 +93,7 @@ def get_list(
     tag: Tuple[str],
     course: Optional[str],
     status: Optional[int],
+    fmt: str,
 ):
     '''
     Get submission list
@@ -86,33 +102,32 @@ def get_list(
         print('Either pid or tag must be given')
         exit(1)
 
-    def extract_fields(s: Submission):
-        s = s.to_dict()
-        return {f: s[f] for f in field}
-
     if before is not None:
         before = datetime.fromisoformat(before)
-    shared_filter = partial(
-        Submission.filter,
+    submission_filter = partial(
+        Submission.iter_filter,
+        cached=True,
         course=course,
         before=before,
         status=status,
     )
-    submission_filter = lambda *args, **ks: map(
-        extract_fields,
-        shared_filter(*args, **ks),
-    )
 
-    submissions = []
+    queries = [submission_filter(problem_id=i) for i in pid]
     if tag:
-        submissions.extend(submission_filter(tags=tag))
-    for i in pid:
-        submissions.extend(submission_filter(problem_id=i))
+        queries.insert(0, submission_filter(tags=tag))
     if output is None:
         output = sys.stdout
     else:
         output = output.open('w')
-    json.dump(submissions, output)
+    if fmt == 'jsonl':
+        for s in chain.from_iterable(queries):
+            output.write(json.dumps(s.to_dict(field)) + '\n')
+            output.flush()
+        return
+    submissions = SubmissionBatch()
+    for q in queries:
+        submissions.extend(q)
+    json.dump([*submissions.to_dicts(field)], output)
 
 
 @submission.command()
@@ -129,10 +144,23 @@ def get_list(
     type=int,
     help='Submission language. Inferred from filename extension if not given',
 )
+@click.option(
+    '--wait',
+    is_flag=True,
+    help='Wait for the verdict and print the judge result.',
+)
+@click.option(
+    '--timeout',
+    type=click.FloatRange(min=0),
+    default=300,
+    help='Seconds to wait for the verdict.',
+)
 def submit(
     problem: int,
     code: str,
     lang: Optional[int],
+    wait: bool,
+    timeout: float,
 ):
     '''
     Create a submission
@@ -141,23 +169,149 @@ def submit(
         if code == '-':
             print('Must specify language if source file not provided')
             exit(1)
-        if code.endswith('.c'):
-            lang = LanguageType.C
-        elif code.endswith('.cpp'):
-            lang = LanguageType.CPP
-        elif code.endswith('.py'):
-            lang = LanguageType.PY3
-        else:
+        try:
+            lang = submission_lib.infer_language(code)
+        except ValueError:
             print('Unknow file extension')
             exit(1)
     if code != '-':
         code = pathlib.Path(code)
-    result = Submission.submit(
+    submission_id = Submission.submit(
         problem_id=problem,
         lang=lang,
         code_path=code,
     )
-    if result == False:
+    if submission_id is None:
+        exit(1)
+    print(f'Submission: {submission_id}')
+    if not wait:
+        return
+
+    def show_progress(elapsed: float):
+        click.echo(f'\rJudging... {elapsed:.1f}s', err=True, nl=False)
+
+    try:
+        result = Submission.wait_result(
+            submission_id,
+            timeout=timeout,
+            on_poll=show_progress,
+        )
+    except TimeoutError as e:
+        click.echo('', err=True)
+        print(e)
+        exit(1)
+    click.echo('\r\033[K', err=True, nl=False)
+    print(f'Status: {SubmissionStatus(result.status).name}')
+    print(f'Score: {result.score}')
+    print(f'Run time: {result.run_time} ms')
+    print(f'Memory: {result.memory_usage} KB')
+    for i, task in enumerate(result.tasks or []):
+        if not isinstance(task, dict):
+            print(f'Task {i}: {task}')
+            continue
+        print(f'Task {i}: {SubmissionStatus(task["status"]).name}, '
+              f'score {task.get("score")}, '
+              f'{task.get("exec_time", task.get("execTime"))} ms, '
+              f'{task.get("memory_usage", task.get("memoryUsage"))} KB')
+
+
+@submission.command()
+@click.argument('problem', type=int)
+@click.argument('source')
+@click.option(
+    '-j',
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=4,
+    help='Number of files uploaded concurrently.',
+)
+@click.option(
+    '--wait',
+    is_flag=True,
+    help='Wait for all verdicts before printing the summary.',
+)
+@click.option(
+    '--timeout',
+    type=click.FloatRange(min=0),
+    default=300,
+    help='Seconds to wait for the verdict of each submission.',
+)
+def submit_batch(
+    problem: int,
+    source: str,
+    jobs: int,
+    wait: bool,
+    timeout: float,
+):
+    '''
+    Submit every source file of a directory or glob pattern
+
+    Language of each file is inferred from its extension, files with
+    unknown extensions are skipped.
+    '''
+    source_dir = pathlib.Path(source)
+    if source_dir.is_dir():
+        paths = sorted(p for p in source_dir.iterdir() if p.is_file())
+    else:
+        paths = sorted(map(pathlib.Path, glob.glob(source)))
+    sources = []
+    for path in paths:
+        try:
+            sources.append((path, submission_lib.infer_language(path.name)))
+        except ValueError:
+            print(f'Skip {path}: unknown file extension')
+    if len(sources) == 0:
+        print('No source file found')
+        exit(1)
+    logined_session().resize_pool(jobs)
+    # path -> [submission id, status, score, run time]
+    results = {path: ['-', '-', '-', '-'] for path, _ in sources}
+    submitted = {}
+    uploads = util.concurrent_map(
+        lambda src: Submission.submit_code(
+            problem_id=problem,
+            lang=src[1],
+            code=src[0],
+        ),
+        sources,
+        jobs=jobs,
+    )
+    for (path, _), _id, error in tqdm(uploads, total=len(sources)):
+        if error is not None:
+            results[path][1] = f'Submit failed: {error}'
+            continue
+        results[path][0] = _id
+        submitted[_id] = path
+    if wait and submitted:
+        poller = StatusPoller(timeout=timeout)
+        for _id in submitted:
+            poller.track(_id, problem)
+        timeouts = {*poller.wait_all()}
+        judged = [_id for _id in submitted if _id not in timeouts]
+        for _id in timeouts:
+            results[submitted[_id]][1] = 'Timeout'
+        verdicts = Submission.get_many(
+            judged,
+            jobs=jobs,
+            retry=2,
+            ordered=False,
+        )
+        for _id, s, error in verdicts:
+            row = results[submitted[_id]]
+            if error is not None:
+                row[1] = f'Fetch failed: {error}'
+                continue
+            row[1:] = [
+                SubmissionStatus(s.status).name,
+                s.score,
+                s.run_time,
+            ]
+    print(
+        util.format_table(
+            ['FILE', 'SUBMISSION', 'STATUS', 'SCORE', 'RUN TIME'],
+            ([str(path), *row] for path, row in results.items()),
+        ))
+    if len(submitted) != len(sources):
         exit(1)
 
 
@@ -183,23 +337,45 @@ def submit(
     '--after',
     help='Download code only submitted after specific time. (ISO format)',
 )
+@click.option(
+    '-j',
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=1,
+    help='Number of submissions downloaded concurrently.',
+)
+@click.option(
+    '--retry',
+    type=click.IntRange(min=0),
+    default=2,
+    help='Retry times for each failed download.',
+)
+@click.option(
+    '--incremental',
+    is_flag=True,
+    help=('Only download submissions which are new or re-sent since '
+          'the last download into the output directory.'),
+)
 def get_problem_code(
     pid: int,
     output: Optional[pathlib.Path],
     before: Optional[str],
     after: Optional[str],
+    jobs: int,
+    retry: int,
+    incremental: bool,
 ):
     '''
     Download all source code of a problem
     '''
     if output is None:
         output = pathlib.Path(str(pid))
-        if output.exists():
-            print(f'The output directory {output} has been created.')
+        if output.exists() and not incremental:
+            print(f'The output directory {output} has been created. '
+                  'Pass --incremental to update it.')
             exit(1)
-        output.mkdir()
-    else:
-        output.mkdir(exist_ok=True)
+    output.mkdir(exist_ok=True)
+    manifest = CodeManifest(output)
     if before is not None:
         before = datetime.fromisoformat(before)
     if after is not None:
@@ -212,14 +388,42 @@ def get_problem_code(
             after=after,
         ).items() if v is not None
     }
-    submissions = Submission.filter(**query_params)
+    # The listing without code is small, count it for the progress bar
+    submissions = [*Submission.iter_filter(**query_params, cached=True)]
+    if incremental:
+        submissions = [*filter(manifest.is_outdated, submissions)]
     print(f'Found {len(submissions)} submissions.')
     print('Start downloading code.')
-    for submission in tqdm(submissions):
-        # Reload for code
-        submission = Submission.get_by_id(submission.id)
-        user_dir = output / submission.user.username
-        user_dir.mkdir(exist_ok=True)
-        main_filename = submission_lib.filename(submission.language_type)
-        main_filename = f'{submission.id}{pathlib.Path(main_filename).suffix}'
-        (user_dir / main_filename).write_text(submission.code)
+    logined_session().resize_pool(jobs)
+    fails = []
+    # Reload for code
+    results = Submission.get_many(
+        (s.id for s in submissions),
+        jobs=jobs,
+        retry=retry,
+        ordered=False,
+    )
+    downloaded = 0
+    try:
+        for _id, loaded, error in tqdm(results, total=len(submissions)):
+            if error is not None:
+                fails.append((_id, error))
+                continue
+            user_dir = output / loaded.user.username
+            user_dir.mkdir(exist_ok=True)
+            main_filename = submission_lib.filename(loaded.language_type)
+            main_filename = f'{loaded.id}{pathlib.Path(main_filename).suffix}'
+            (user_dir / main_filename).write_text(loaded.code)
+            manifest.add(loaded, user_dir / main_filename)
+            downloaded += 1
+            # Checkpoint so that an interrupted run can be resumed
+            if downloaded % 100 == 0:
+                manifest.save()
+    finally:
+        manifest.save()
+    print(f'Downloaded {downloaded} submissions.')
+    if fails:
+        print(f'Failed to download {len(fails)} submissions:')
+        for _id, error in fails:
+            print(f'{_id}: {error!r}')
+        exit(1)
@@ -9,7 +9,9 @@ __all__ = ('user', )
 
 @click.group()
 def user():
-    pass
+    '''
+    User API
+    '''
 
 
 @user.command()
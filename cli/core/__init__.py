@@ -1,19 +1,26 @@
-from .submission import Submission
-from .config import Config
-from .context import Context
-from .grade import MultiDeadLinePolicy
-from .homework import Homework
-from .user import User
-from .problem import Problem
-from .course import Course
+import importlib
 
-__all__ = (
-    Submission,
-    Config,
-    Context,
-    MultiDeadLinePolicy,
-    Homework,
-    User,
-    Problem,
-    Course,
-)
+# Public name -> submodule, loaded on first access to keep startup fast
+_LAZY_ATTRS = {
+    'Submission': 'submission',
+    'SubmissionBatch': 'batch',
+    'Config': 'config',
+    'Context': 'context',
+    'MultiDeadLinePolicy': 'grade',
+    'Homework': 'homework',
+    'User': 'user',
+    'Problem': 'problem',
+    'Course': 'course',
+}
+
+__all__ = tuple(_LAZY_ATTRS)
+
+
+def __getattr__(name: str):
+    try:
+        module = _LAZY_ATTRS[name]
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
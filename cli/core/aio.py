@@ -0,0 +1,184 @@
+'''
+Thread-backed asyncio facade of the core API
+
+The coroutines return the same model objects as the sync API, so core calls
+can be mixed into async code. They do not do native async IO. Each request
+is still a blocking call of the shared `requests` session, run in the
+bounded thread pool of `thread_pool`. At most `workers` requests are in
+flight, and the event loop stays free meanwhile.
+'''
+import asyncio
+import logging
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import (
+    AsyncGenerator,
+    Callable,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
+from . import submission as submission_lib
+from .auth import logined_session
+from .course import Course as _Course
+from .homework import Homework as _Homework
+from .problem import Problem as _Problem
+from .submission import LanguageType
+
+T = TypeVar('T')
+
+_executor: ContextVar[Optional[ThreadPoolExecutor]] = ContextVar(
+    'executor',
+    default=None,
+)
+
+
+class thread_pool:
+    '''
+    Async context running core API calls in `workers` threads
+
+        async with aio.thread_pool(workers=32):
+            submissions = await asyncio.gather(
+                *map(aio.Submission.get_by_id, ids))
+    '''
+
+    def __init__(self, workers: int = 16) -> None:
+        self.workers = workers
+        self.executor = None
+        self._token = None
+
+    async def __aenter__(self) -> 'thread_pool':
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._token = _executor.set(self.executor)
+        await run(logined_session().resize_pool, self.workers)
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        _executor.reset(self._token)
+        self.executor.shutdown(wait=False)
+
+
+async def run(func: Callable[..., T], *args, **ks) -> T:
+    '''
+    Run a blocking core API call in the current `thread_pool` (or the loop's
+    default executor) without blocking the event loop
+    '''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor.get(),
+        partial(func, *args, **ks),
+    )
+
+
+class Submission:
+
+    @staticmethod
+    async def get_by_id(_id: str) -> submission_lib.Submission:
+        return await run(submission_lib.Submission.get_by_id, _id)
+
+    @staticmethod
+    async def filter(**ks) -> List[submission_lib.Submission]:
+        '''
+        Same parameters as `cli.core.Submission.filter`
+        '''
+        return await run(submission_lib.Submission.filter, **ks)
+
+    @staticmethod
+    async def iter_filter(
+        page_size: int = 1000,
+        **ks,
+    ) -> AsyncGenerator[submission_lib.Submission, None]:
+        '''
+        Same parameters as `cli.core.Submission.iter_filter`. The sync
+        generator is advanced in the thread pool a page at a time.
+        '''
+        it = submission_lib.Submission.iter_filter(page_size=page_size, **ks)
+        next_page = lambda: [*islice(it, page_size)]
+        try:
+            while True:
+                page = await run(next_page)
+                for s in page:
+                    yield s
+                if len(page) < page_size:
+                    break
+        finally:
+            await run(it.close)
+
+    @staticmethod
+    async def wait_result(
+        _id: str,
+        timeout: float = 300,
+        interval: float = 0.25,
+        max_interval: float = 2,
+    ) -> submission_lib.Submission:
+        '''
+        Poll a submission until it is judged, with backoff
+        '''
+        return await run(
+            submission_lib.Submission.wait_result,
+            _id,
+            timeout=timeout,
+            interval=interval,
+            max_interval=max_interval,
+        )
+
+    @staticmethod
+    async def rejudge(
+        submission: submission_lib.Submission,
+        timeout: float = 300,
+    ) -> Optional[submission_lib.Submission]:
+        '''
+        Rejudge and wait for the new result, return `None` for handwritten
+        submissions which are not rejudged
+        '''
+        if submission.language_type == LanguageType.HAND:
+            logging.warning('Rejudge a handwriten submission')
+            return None
+        await run(submission.trigger_rejudge)
+        return await Submission.wait_result(submission.id, timeout=timeout)
+
+    @staticmethod
+    async def submit(
+        problem_id: int,
+        lang: LanguageType,
+        code: Union[str, Path],
+    ) -> str:
+        return await run(
+            submission_lib.Submission.submit_code,
+            problem_id=problem_id,
+            lang=lang,
+            code=code,
+        )
+
+
+class Problem:
+
+    @staticmethod
+    async def get_by_id(pid: int) -> _Problem:
+        return await run(_Problem.get_by_id, pid)
+
+    @staticmethod
+    async def filter(**ks) -> List[_Problem]:
+        return await run(_Problem.filter, **ks)
+
+
+class Homework:
+
+    @staticmethod
+    async def get_by_id(_id: str) -> _Homework:
+        return await run(_Homework.get_by_id, _id)
+
+    @staticmethod
+    async def get_by_name(course: str, name: str) -> _Homework:
+        return await run(_Homework.get_by_name, course, name)
+
+
+class Course:
+
+    @staticmethod
+    async def get_by_name(name: str) -> _Course:
+        return await run(_Course.get_by_name, name)
@@ -1,20 +1,340 @@
+import json
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
 import requests as rq
 from .config import Config
+from .throttle import Throttle
+from .trace import Tracer
 
+# Lifetime assumed for session cookies which carry no explicit expiry
+DEFAULT_SESSION_TTL = 30 * 60
+# Re-login a bit earlier than the real expiry to avoid racing the server
+EXPIRY_MARGIN = 30
+# Methods which can be sent again without side effects
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+# Statuses worth retrying, 429 means the request was not processed
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BACKOFF = 0.5
+MAX_BACKOFF = 30
 
-def logined_session():
-    sess = rq.Session()
-    # Config might not load before
-    if Config.curr_user is None:
-        Config.load()
-    resp = sess.post(
-        f'{Config.API_BASE}/auth/session',
-        json=Config.curr_user,
-    )
-    if resp.status_code == 403:
-        raise PermissionError('Invalid credential.')
-    assert resp.ok, resp.text
-    return sess
+
+class NojSession(rq.Session):
+    '''
+    Authenticated session shared by the whole process.
+
+    It logs in lazily, re-authenticates when the credential is expired or
+    rejected (401/403), and keeps the connection pool alive across `with`
+    blocks so that every API call does not pay a new login and TLS handshake.
+    '''
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.expires: Optional[float] = None
+        self.throttle = Throttle.from_config()
+        self._login_lock = threading.Lock()
+
+    def __exit__(self, *args) -> None:
+        # Keep the pooled connections for the next caller, the session is
+        # closed by `close_session` at exit.
+        pass
+
+    def resize_pool(self, size: int) -> None:
+        '''
+        Allow `size` concurrent connections to be kept alive
+        '''
+        adapter = rq.adapters.HTTPAdapter(pool_maxsize=size)
+        for old in self.adapters.values():
+            old.close()
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    @staticmethod
+    def is_auth_url(url: str) -> bool:
+        return url.startswith(f'{Config.API_BASE}/auth/')
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires is None or time.time() >= self.expires
+
+    def login(self) -> None:
+        # Config might not load before
+        if Config.curr_user is None:
+            Config.load()
+        self.cookies.clear()
+        if Tracer.current is not None:
+            Tracer.current.count_login()
+        resp = self._send_with_retry(
+            'POST',
+            f'{Config.API_BASE}/auth/session',
+            json=Config.curr_user,
+        )
+        if resp.status_code == 403:
+            raise PermissionError('Invalid credential.')
+        assert resp.ok, resp.text
+        self.expires = self._cookie_expires()
+        username = Config.curr_user['username']
+        logging.debug(f'Logged in as {username} [base={Config.API_BASE}]')
+        SessionStore.save(self)
+
+    def ensure_login(self, stale_expires: Optional[float] = None) -> None:
+        '''
+        Login if the credential is expired. `stale_expires` is the expiry
+        observed by a caller whose request got rejected, another thread might
+        have refreshed the credential in the meantime.
+        '''
+        with self._login_lock:
+            if stale_expires is not None and self.expires != stale_expires:
+                return
+            if stale_expires is None and not self.is_expired:
+                return
+            self.login()
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        *args,
+        retry: int = 0,
+        **ks,
+    ) -> rq.Response:
+        '''
+        Send a request within the throttle budget, record it if tracing is
+        enabled
+        '''
+        tracer = Tracer.current
+        if tracer is None:
+            with self.throttle.slot():
+                return super().request(method, url, *args, **ks)
+        start = time.perf_counter()
+        status, size = None, 0
+        try:
+            with self.throttle.slot():
+                # Do not count the time waiting for the budget
+                start = time.perf_counter()
+                resp = super().request(method, url, *args, **ks)
+            status, size = resp.status_code, len(resp.content)
+            return resp
+        finally:
+            tracer.record(
+                method,
+                url,
+                status=status,
+                size=size,
+                latency=time.perf_counter() - start,
+                retry=retry,
+            )
+
+    def _send_with_retry(
+        self,
+        method: str,
+        url: str,
+        *args,
+        replayable: bool = True,
+        **ks,
+    ) -> rq.Response:
+        '''
+        Send a request and retry with jittered exponential backoff on
+        throttling, server errors and connection failures. Requests which
+        might have been processed are only retried if they are idempotent.
+        '''
+        ks.setdefault('timeout', Config.TIMEOUT)
+        idempotent = method.upper() in IDEMPOTENT_METHODS and replayable
+        max_retries = Config.MAX_RETRIES if replayable else 0
+        for retry in range(max_retries + 1):
+            try:
+                resp = self._send(method, url, *args, retry=retry, **ks)
+            except rq.ConnectTimeout:
+                # The request was never sent
+                if retry == max_retries:
+                    raise
+                delay = None
+            except (rq.ConnectionError, rq.Timeout):
+                if not idempotent or retry == max_retries:
+                    raise
+                delay = None
+            else:
+                if resp.status_code not in RETRY_STATUSES:
+                    return resp
+                if resp.status_code != 429 and not idempotent:
+                    return resp
+                if retry == max_retries:
+                    return resp
+                delay = self._retry_after(resp)
+            if delay is None:
+                cap = min(MAX_BACKOFF, RETRY_BACKOFF * 2**retry)
+                delay = random.uniform(0, cap)
+            logging.debug(f'Retry {method} {url} in {delay:.2f}s '
+                          f'({retry + 1}/{max_retries})')
+            time.sleep(delay)
+
+    @staticmethod
+    def _retry_after(resp: rq.Response) -> Optional[float]:
+        try:
+            return min(float(resp.headers['Retry-After']), MAX_BACKOFF)
+        except (KeyError, ValueError):
+            return None
+
+    @staticmethod
+    def is_replayable(ks: Dict[str, Any]) -> bool:
+        '''
+        Whether the request body can be sent again, a stream can not
+        '''
+        bodies = [ks.get('data')]
+        files = ks.get('files') or {}
+        if not isinstance(files, dict):
+            return False
+        for f in files.values():
+            bodies.append(f[1] if isinstance(f, tuple) else f)
+        return not any(hasattr(b, 'read') for b in bodies)
+
+    def request(self, method: str, url: str, *args, **ks) -> rq.Response:
+        replayable = self.is_replayable(ks)
+        if self.is_auth_url(url):
+            return self._send_with_retry(method, url, *args, **ks)
+        self.ensure_login()
+        expires = self.expires
+        resp = self._send_with_retry(
+            method,
+            url,
+            *args,
+            replayable=replayable,
+            **ks,
+        )
+        if resp.status_code in (401, 403) and replayable:
+            logging.debug(f'Got {resp.status_code}, try to login again')
+            SessionStore.discard()
+            self.ensure_login(stale_expires=expires)
+            resp = self._send_with_retry(method, url, *args, **ks)
+        return resp
+
+    def _cookie_expires(self) -> float:
+        expires = [c.expires for c in self.cookies if c.expires is not None]
+        if len(expires) == 0:
+            return time.time() + DEFAULT_SESSION_TTL
+        return min(expires) - EXPIRY_MARGIN
+
+
+class SessionStore:
+    '''
+    Persist session cookies under NOJ_HOME so that the next run within the
+    cookie lifetime can skip the login round trip. Nothing is stored if
+    `Config.PERSIST` is off.
+    '''
+
+    FILENAME = '.session.json'
+
+    @classmethod
+    def path(cls):
+        return Config.config_path().parent / cls.FILENAME
+
+    @classmethod
+    def key(cls) -> str:
+        return f'{Config.API_BASE}|{Config.curr_user["username"]}'
+
+    @classmethod
+    def _read(cls) -> Dict[str, Any]:
+        try:
+            with cls.path().open() as f:
+                store = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if not isinstance(store, dict):
+            return {}
+        return store
+
+    @classmethod
+    def _write(cls, store: Dict[str, Any]) -> None:
+        path = cls.path()
+        tmp = path.with_suffix('.tmp')
+        with tmp.open('w') as f:
+            json.dump(store, f)
+        tmp.chmod(0o600)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, sess: NojSession) -> bool:
+        '''
+        Restore cookies into `sess`, return whether a usable one is found.
+        '''
+        if not Config.PERSIST:
+            return False
+        try:
+            entry = cls._read()[cls.key()]
+        except KeyError:
+            return False
+        if entry['expires'] <= time.time():
+            return False
+        for c in entry['cookies']:
+            sess.cookies.set(**c)
+        sess.expires = entry['expires']
+        logging.debug('Reuse session stored at '
+                      f'{cls.path()} [expires={entry["expires"]}]')
+        return True
+
+    @classmethod
+    def save(cls, sess: NojSession) -> None:
+        if not Config.PERSIST:
+            return
+        store = cls._read()
+        cookies = [{
+            'name': c.name,
+            'value': c.value,
+            'domain': c.domain,
+            'path': c.path,
+            'expires': c.expires,
+            'secure': c.secure,
+        } for c in sess.cookies]
+        store[cls.key()] = {'expires': sess.expires, 'cookies': cookies}
+        try:
+            cls._write(store)
+        except OSError as e:
+            logging.debug(f'Failed to store session: {e}')
+
+    @classmethod
+    def discard(cls) -> None:
+        if not Config.PERSIST:
+            return
+        store = cls._read()
+        if store.pop(cls.key(), None) is not None:
+            try:
+                cls._write(store)
+            except OSError as e:
+                logging.debug(f'Failed to discard session: {e}')
+
+
+_session: Optional[NojSession] = None
+_session_lock = threading.Lock()
+
+
+def logined_session() -> NojSession:
+    '''
+    Return the process-wide authenticated session
+    '''
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Config might not load before
+            if Config.curr_user is None:
+                Config.load()
+            sess = NojSession()
+            SessionStore.load(sess)
+            _session = sess
+    return _session
+
+
+def close_session() -> None:
+    '''
+    Close the process-wide session, the next `logined_session` call will
+    create a new one.
+    '''
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
 
 
 def is_valid_username(name: str) -> bool:
@@ -0,0 +1,135 @@
+from array import array
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+)
+from .submission import Submission
+from .user import User
+
+
+class SubmissionBatch:
+    '''
+    Columnar container of submissions without tasks. Numeric fields are
+    kept in `array`s and users are shared `User` objects, which is much
+    smaller than a list of `Submission`s when handling a whole course.
+    '''
+
+    NUMERIC_COLUMNS = {
+        'problem_ids': 'l',
+        'last_send': 'd',
+        'created': 'd',
+        'memory_usages': 'q',
+        'run_times': 'q',
+        'scores': 'l',
+        'statuses': 'l',
+        'language_types': 'b',
+    }
+
+    def __init__(self) -> None:
+        self.ids: List[str] = []
+        self.users: List[User] = []
+        # Mostly `None`, listings do not carry code
+        self.codes: List[Optional[str]] = []
+        for name, typecode in self.NUMERIC_COLUMNS.items():
+            setattr(self, name, array(typecode))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, i: int) -> Submission:
+        return Submission(
+            _id=self.ids[i],
+            user=self.users[i],
+            last_send=self.last_send[i],
+            created=self.created[i],
+            memory_usage=self.memory_usages[i],
+            problem_id=self.problem_ids[i],
+            run_time=self.run_times[i],
+            score=self.scores[i],
+            status=self.statuses[i],
+            language_type=self.language_types[i],
+            tasks=None,
+            code=self.codes[i],
+        )
+
+    def __iter__(self) -> Generator[Submission, None, None]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def usernames(self) -> Generator[str, None, None]:
+        return (u.username for u in self.users)
+
+    def append(self, s: Submission) -> None:
+        self.ids.append(s.id)
+        self.users.append(s.user)
+        self.codes.append(s.code)
+        self.problem_ids.append(s.problem_id)
+        self.last_send.append(s.last_send_timestamp)
+        self.created.append(s.created_timestamp)
+        self.memory_usages.append(s.memory_usage)
+        self.run_times.append(s.run_time)
+        self.scores.append(s.score)
+        self.statuses.append(s.status)
+        self.language_types.append(s.language_type)
+
+    def append_payload(self, p: Dict[str, Any]) -> None:
+        '''
+        Append a submission payload returned by API
+        '''
+        self.ids.append(p['submissionId'])
+        self.users.append(User.intern(p['user']))
+        self.codes.append(p.get('code'))
+        self.problem_ids.append(p['problemId'])
+        self.last_send.append(p['lastSend'])
+        self.created.append(p['timestamp'])
+        self.memory_usages.append(p['memoryUsage'])
+        self.run_times.append(p['runTime'])
+        self.scores.append(p['score'])
+        self.statuses.append(p['status'])
+        self.language_types.append(p['languageType'])
+
+    def extend(self, submissions: Iterable[Submission]) -> None:
+        if isinstance(submissions, SubmissionBatch):
+            self.ids.extend(submissions.ids)
+            self.users.extend(submissions.users)
+            self.codes.extend(submissions.codes)
+            for name in self.NUMERIC_COLUMNS:
+                getattr(self, name).extend(getattr(submissions, name))
+            return
+        for s in submissions:
+            self.append(s)
+
+    @classmethod
+    def from_submissions(
+        cls,
+        submissions: Iterable[Submission],
+    ) -> 'SubmissionBatch':
+        batch = cls()
+        batch.extend(submissions)
+        return batch
+
+    @classmethod
+    def from_payloads(
+        cls,
+        payloads: Iterable[Dict[str, Any]],
+    ) -> 'SubmissionBatch':
+        batch = cls()
+        for p in payloads:
+            batch.append_payload(p)
+        return batch
+
+    def to_dicts(
+        self,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Generator[Dict[str, Any], None, None]:
+        '''
+        Yield `Submission.to_dict` of each row, only with `fields` if given
+        '''
+        for s in self:
+            yield s.to_dict(fields)
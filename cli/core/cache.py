@@ -0,0 +1,266 @@
+import json
+import hashlib
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Generator, Optional, Tuple
+from .config import Config
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS submissions (
+    id TEXT PRIMARY KEY,
+    problem_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    course TEXT,
+    timestamp REAL NOT NULL,
+    last_send REAL NOT NULL,
+    status INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_problem ON submissions (problem_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_username ON submissions (username, timestamp);
+CREATE INDEX IF NOT EXISTS idx_course ON submissions (course, timestamp);
+CREATE TABLE IF NOT EXISTS sync_state (
+    scope TEXT PRIMARY KEY,
+    watermark REAL NOT NULL,
+    synced_at REAL NOT NULL
+);
+'''
+PENDING = -1
+
+
+class SubmissionCache:
+    '''
+    Local SQLite copy of submission payloads (without code). A course or
+    problem is answered locally for `Config.SUBMISSION_CACHE_TTL` seconds
+    after it is synced by `sync`.
+    '''
+
+    # Set to False to always query the API
+    enabled = True
+    # Submissions created within this many seconds before the newest synced
+    # one are fetched again, to pick up re-sent and rejudged results
+    OVERLAP = 3600
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        create: bool = True,
+    ) -> None:
+        if path is None:
+            path = self.default_path(create)
+        self.path = path
+        if create:
+            self.conn = sqlite3.connect(path)
+            self.conn.executescript(SCHEMA)
+            columns = {
+                row[1]
+                for row in self.conn.execute('PRAGMA table_info(sync_state)')
+            }
+            # Databases created before the watermark column was renamed
+            if 'last_send' in columns:
+                self.conn.execute('ALTER TABLE sync_state '
+                                  'RENAME COLUMN last_send TO watermark')
+        else:
+            # Fail instead of creating an empty database
+            uri = f'{path.resolve().as_uri()}?mode=rw'
+            self.conn = sqlite3.connect(uri, uri=True)
+        self.conn.row_factory = sqlite3.Row
+
+    @classmethod
+    def open_existing(cls) -> Optional['SubmissionCache']:
+        '''
+        Open the cache created by `sync`, return `None` if it is disabled or
+        does not exist
+        '''
+        if not cls.enabled or not Config.PERSIST:
+            return None
+        try:
+            return cls(create=False)
+        except (OSError, sqlite3.Error) as e:
+            logging.debug(f'No submission cache: {e}')
+            return None
+
+    def __enter__(self) -> 'SubmissionCache':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.conn.close()
+
+    @classmethod
+    def default_path(cls, create: bool = True) -> Path:
+        root = Config.config_path().parent / 'cache'
+        if create:
+            root.mkdir(exist_ok=True)
+        # Different instances have different submissions
+        api = hashlib.sha1(Config.API_BASE.encode()).hexdigest()[:8]
+        return root / f'submissions-{api}.db'
+
+    @staticmethod
+    def scope_condition(scope: str) -> Tuple[str, Any]:
+        '''
+        SQL condition and its argument selecting submissions of a scope
+        '''
+        kind, value = scope.split(':', 1)
+        if kind == 'course':
+            return 'course = ?', value
+        return 'problem_id = ?', int(value)
+
+    @staticmethod
+    def scope(params: Dict[str, Any]) -> Optional[str]:
+        '''
+        Synced scope needed to answer the query, `None` if it can not be
+        answered locally.
+        '''
+        if 'tags' in params:
+            return None
+        if 'course' in params:
+            return f'course:{params["course"]}'
+        if 'problemId' in params:
+            return f'problem:{params["problemId"]}'
+        return None
+
+    def covers(self, params: Dict[str, Any]) -> bool:
+        '''
+        Whether the query can be answered locally: its scope is synced
+        within `Config.SUBMISSION_CACHE_TTL` seconds and no submission in it
+        was pending at that time
+        '''
+        scope = self.scope(params)
+        if scope is None:
+            return False
+        row = self.conn.execute(
+            'SELECT synced_at FROM sync_state WHERE scope = ?',
+            (scope, ),
+        ).fetchone()
+        if row is None:
+            return False
+        # Results might be rejudged on the server after the sync
+        if time.time() - row['synced_at'] >= Config.SUBMISSION_CACHE_TTL:
+            logging.debug(f'Sync of {scope} is outdated')
+            return False
+        cond, arg = self.scope_condition(scope)
+        row = self.conn.execute(
+            f'SELECT 1 FROM submissions WHERE {cond} AND status = ? LIMIT 1',
+            (arg, PENDING),
+        ).fetchone()
+        return row is None
+
+    def mark_pending(self, _id: str) -> None:
+        '''
+        Mark a cached submission as pending, e.g. after it is rejudged, so
+        that it is fetched again by the next sync
+        '''
+        with self.conn:
+            self.conn.execute(
+                'UPDATE submissions SET status = ? WHERE id = ?',
+                (PENDING, _id),
+            )
+
+    def query(
+        self,
+        params: Dict[str, Any],
+    ) -> Generator[Dict[str, Any], None, None]:
+        '''
+        Yield payloads matching API query parameters
+        '''
+        columns = {
+            'course': 'course = ?',
+            'problemId': 'problem_id = ?',
+            'username': 'username = ?',
+            'status': 'status = ?',
+            'before': 'timestamp < ?',
+            'after': 'timestamp >= ?',
+        }
+        conds, args = [], []
+        for k, v in params.items():
+            if k in columns:
+                conds.append(columns[k])
+                args.append(v)
+        sql = 'SELECT payload FROM submissions'
+        if conds:
+            sql += ' WHERE ' + ' AND '.join(conds)
+        sql += ' ORDER BY timestamp DESC'
+        for row in self.conn.execute(sql, args):
+            yield json.loads(row['payload'])
+
+    def sync(
+        self,
+        course: Optional[str] = None,
+        problem_id: Optional[int] = None,
+        full: bool = False,
+        page_size: int = 1000,
+    ) -> int:
+        '''
+        Fetch submissions created after the last sync of this course or
+        problem, return the number of stored records. Submissions which were
+        pending, and the ones created within `OVERLAP` seconds before the
+        last sync, are fetched again.
+        '''
+        from .submission import Submission
+        if (course is None) == (problem_id is None):
+            raise ValueError('Either course or problem_id should be given.')
+        params = {'course': course} if course else {'problemId': problem_id}
+        scope = self.scope(params)
+        if full:
+            with self.conn:
+                self.conn.execute(
+                    'DELETE FROM sync_state WHERE scope = ?',
+                    (scope, ),
+                )
+        # The server filters `after` by creation time, so the watermark is
+        # the newest creation time
+        row = self.conn.execute(
+            'SELECT watermark FROM sync_state WHERE scope = ?',
+            (scope, ),
+        ).fetchone()
+        watermark = 0 if row is None else row['watermark']
+        if row is not None:
+            cond, arg = self.scope_condition(scope)
+            pending = self.conn.execute(
+                'SELECT MIN(timestamp) FROM submissions '
+                f'WHERE {cond} AND status = ?',
+                (arg, PENDING),
+            ).fetchone()[0]
+            after = watermark - self.OVERLAP
+            if pending is not None:
+                after = min(after, pending)
+            params['after'] = max(0, int(after))
+        count = 0
+        offset = 0
+        while True:
+            page = Submission._fetch_page(params, offset, page_size)
+            with self.conn:
+                self.conn.executemany(
+                    '''
+                    INSERT INTO submissions VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                        course = COALESCE(excluded.course, course),
+                        last_send = excluded.last_send,
+                        status = excluded.status,
+                        payload = excluded.payload
+                    ''',
+                    [(
+                        p['submissionId'],
+                        p['problemId'],
+                        p['user']['username'],
+                        course,
+                        p['timestamp'],
+                        p['lastSend'],
+                        p['status'],
+                        json.dumps(p),
+                    ) for p in page],
+                )
+            count += len(page)
+            watermark = max([watermark, *(p['timestamp'] for p in page)])
+            if len(page) < page_size:
+                break
+            offset += page_size
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)',
+                (scope, watermark, time.time()),
+            )
+        logging.debug(f'Synced {count} submissions [scope={scope}]')
+        return count
@@ -1,14 +1,37 @@
 import os
 import json
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 from .context import Context
+from .util import atomic_write_text
 
 
 class Config:
     CONTEXT = 'default'
     API_BASE = 'https://api.noj.tw/'
     curr_user = None
+    # (connect, read) timeout in seconds of each request
+    TIMEOUT = (5, 60)
+    # Max retry times of a failed request
+    MAX_RETRIES = 3
+    # Requests per second sent by the shared session, None for unlimited
+    RATE_LIMIT = None
+    RATE_BURST = 1
+    # Max concurrent requests of the shared session, None for unlimited
+    MAX_IN_FLIGHT = None
+    # 'process', or 'host' to share the rate limit with other processes
+    RATE_LIMIT_SCOPE = 'process'
+    # Seconds before cached homework, course and problem data is revalidated
+    METADATA_TTL = 300
+    # Seconds after `sync` during which cached submissions answer queries
+    SUBMISSION_CACHE_TTL = 600
+    # Whether session and caches are stored under NOJ_HOME, it is off when
+    # the credential comes from environment variables
+    PERSIST = True
+    # Resolved config root, created once per process
+    _config_root: Optional[Path] = None
+    # (path, (mtime_ns, size), content) of the last parsed config file
+    _config_cache: Optional[Tuple[Path, Tuple[int, int], Dict]] = None
 
     @classmethod
     def default_context(cls):
@@ -16,31 +39,66 @@ class Config:
 
     @classmethod
     def config_path(cls) -> Path:
-        config_root = os.getenv('NOJ_HOME', Path.home() / '.noj')
-        config_root = Path(config_root)
-        config_root.mkdir(exist_ok=True)
-        if not config_root.is_dir():
-            raise NotADirectoryError(f'{config_root} is not a directory.')
+        config_root = Path(os.getenv('NOJ_HOME', Path.home() / '.noj'))
+        if config_root != cls._config_root:
+            config_root.mkdir(exist_ok=True)
+            if not config_root.is_dir():
+                raise NotADirectoryError(f'{config_root} is not a directory.')
+            cls._config_root = config_root
         return config_root / '.config.json'
 
     @classmethod
     def load_config_file(cls) -> Dict[str, Any]:
         '''
-        Load .config.json
+        Load .config.json, the parsed content is reused until the file is
+        modified
         '''
-        config = json.load(cls.config_path().open())
+        path = cls.config_path()
+        stat = path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        if cls._config_cache is not None:
+            cached_path, cached_version, config = cls._config_cache
+            if cached_path == path and cached_version == version:
+                return config
+        with path.open() as f:
+            config = json.load(f)
         if type(config) != dict:
             raise TypeError(f'Ivalid config type. It should be a JSON object.')
+        cls._config_cache = (path, version, config)
         return config
 
     @classmethod
     def load(cls, key: str = CONTEXT) -> None:
         '''
-        Load existing context
+        Load existing context. If credential is given by environment variables
+        NOJ_USERNAME and NOJ_PASSWORD, nothing under NOJ_HOME is read or
+        written.
         '''
-        context = Context(key)
+        context = Context.from_env()
+        cls.PERSIST = context is None
+        if context is None:
+            context = Context(key)
         cls.API_BASE = context.api_base
         cls.curr_user = context.login_credential()
+        if context.timeout is not None:
+            timeout = context.timeout
+            if isinstance(timeout, list):
+                timeout = tuple(timeout)
+            cls.TIMEOUT = timeout
+        if context.retries is not None:
+            cls.MAX_RETRIES = context.retries
+        if context.rate_limit is not None:
+            cls.RATE_LIMIT = context.rate_limit
+        if context.rate_burst is not None:
+            cls.RATE_BURST = context.rate_burst
+        if context.max_in_flight is not None:
+            cls.MAX_IN_FLIGHT = context.max_in_flight
+        if context.rate_limit_scope is not None:
+            cls.RATE_LIMIT_SCOPE = context.rate_limit_scope
+        if context.metadata_ttl is not None:
+            cls.METADATA_TTL = context.metadata_ttl
+        if context.submission_cache_ttl is not None:
+            cls.SUBMISSION_CACHE_TTL = context.submission_cache_ttl
 
     @classmethod
     def add_context(cls, key: str):
@@ -53,9 +111,9 @@ class Config:
             config = {}
         if key in config:
             raise ValueError('Duplicated context key.')
-        config.update({key: cls.default_context()})
-        config_path = cls.config_path()
-        json.dump(config, config_path.open('w'))
+        config = {**config, key: cls.default_context()}
+        atomic_write_text(cls.config_path(), json.dumps(config))
+        cls._config_cache = None
 
 
-# Config.add_context('default')
\ No newline at end of file
+# Config.add_context('default')
@@ -1,20 +1,59 @@
-from typing import Dict
+import os
+from typing import Any, Dict, Optional
 
 
 class Context:
 
-    def __init__(self, key: str) -> None:
-        from .config import Config
-        try:
-            context = Config.load_config_file()[key]
-        except KeyError:
-            raise ValueError(f'context \'{key}\' not found.')
+    def __init__(
+        self,
+        key: str,
+        values: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if values is None:
+            from .config import Config
+            try:
+                values = Config.load_config_file()[key]
+            except KeyError:
+                raise ValueError(f'context \'{key}\' not found.')
         try:
-            self.api_base = context['api_base']
-            self.username = context['username']
-            self.password = context['password']
+            self.api_base = values['api_base']
+            self.username = values['username']
+            self.password = values['password']
         except KeyError:
             raise ValueError('Invalid context value.')
+        # Optional transport settings, see `Config`
+        self.timeout = values.get('timeout')
+        self.retries = values.get('retries')
+        self.rate_limit = values.get('rate_limit')
+        self.rate_burst = values.get('rate_burst')
+        self.max_in_flight = values.get('max_in_flight')
+        self.rate_limit_scope = values.get('rate_limit_scope')
+        self.metadata_ttl = values.get('metadata_ttl')
+        self.submission_cache_ttl = values.get('submission_cache_ttl')
+
+    @classmethod
+    def from_env(cls) -> Optional['Context']:
+        '''
+        Build context from NOJ_API_BASE, NOJ_USERNAME and NOJ_PASSWORD, return
+        `None` if the credential is not set.
+        '''
+        username = os.getenv('NOJ_USERNAME')
+        password = os.getenv('NOJ_PASSWORD')
+        if username is None or password is None:
+            return None
+        from .config import Config
+        api_base = os.getenv(
+            'NOJ_API_BASE',
+            Config.default_context()['api_base'],
+        )
+        return cls(
+            'env',
+            {
+                'api_base': api_base,
+                'username': username,
+                'password': password,
+            },
+        )
 
     def login_credential(self) -> Dict[str, str]:
         return {
@@ -0,0 +1,140 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from .auth import logined_session
+from .config import Config
+from .course import Course
+from . import util
+
+
+class CopycatReport:
+    '''
+    Plagiarism report of a problem, the URLs are empty until it is generated
+    '''
+
+    LANGUAGES = ('cpp', 'python')
+
+    def __init__(
+        self,
+        problem_id: int,
+        cpp_report: str = '',
+        python_report: str = '',
+    ) -> None:
+        self.problem_id = problem_id
+        self.cpp_report = cpp_report
+        self.python_report = python_report
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.cpp_report or self.python_report)
+
+    def urls(self) -> Dict[str, str]:
+        '''
+        Language -> URL of generated reports
+        '''
+        return {
+            lang: getattr(self, f'{lang}_report')
+            for lang in self.LANGUAGES if getattr(self, f'{lang}_report')
+        }
+
+    @classmethod
+    def request(cls, course: Course, problem_id: int) -> None:
+        '''
+        Ask the server to generate the report of a problem
+        '''
+        students = {s.username: s.username for s in course.students}
+        with logined_session() as sess:
+            resp = sess.post(
+                f'{Config.API_BASE}/copycat',
+                json={
+                    'course': course.name,
+                    'problemId': problem_id,
+                    'studentNicknames': students,
+                },
+            )
+            assert resp.ok, resp.text
+
+    @classmethod
+    def get(cls, course: str, problem_id: int) -> 'CopycatReport':
+        '''
+        Fetch report URLs of a problem, raise `ValueError` with the response
+        if it carries none of them
+        '''
+        with logined_session() as sess:
+            resp = sess.get(
+                f'{Config.API_BASE}/copycat',
+                params={
+                    'course': course,
+                    'problemId': problem_id,
+                },
+            )
+            assert resp.ok, resp.text
+        data = resp.json().get('data')
+        keys = [f'{lang}_report' for lang in cls.LANGUAGES]
+        if not isinstance(data, dict) or not any(k in data for k in keys):
+            raise ValueError(f'Unexpected copycat response: {resp.text}')
+        return cls(
+            problem_id=problem_id,
+            cpp_report=data.get('cpp_report') or '',
+            python_report=data.get('python_report') or '',
+        )
+
+    @classmethod
+    def wait_all(
+        cls,
+        course: str,
+        problem_ids: Iterable[int],
+        jobs: int = 8,
+        timeout: float = 600,
+        interval: float = 2,
+        max_interval: float = 30,
+        previous: Optional[Dict[int, 'CopycatReport']] = None,
+    ) -> Tuple[Dict[int, 'CopycatReport'], List[int]]:
+        '''
+        Poll reports of all problems together until they are generated.
+        Return the reports and ids of problems exceed the timeout. The
+        interval is doubled while nothing finishes.
+
+        `previous` are the reports seen before requesting new ones. They
+        are not taken as the result until the server clears or replaces
+        them.
+        '''
+        pending = {*problem_ids}
+        reports = {}
+        # problem id -> URLs of the last run which are still served
+        stale = {
+            pid: r.urls()
+            for pid, r in (previous or {}).items() if r.ready
+        }
+
+        def check():
+            results = util.concurrent_map(
+                lambda pid: cls.get(course, pid),
+                sorted(pending),
+                jobs=jobs,
+            )
+            finished = False
+            for pid, report, error in results:
+                if error is not None:
+                    logging.debug(f'Poll report {pid} failed: {error!r}')
+                elif not report.ready:
+                    stale.pop(pid, None)
+                elif report.urls() != stale.get(pid):
+                    reports[pid] = report
+                    pending.remove(pid)
+                    finished = True
+            return len(pending) == 0, finished
+
+        util.poll_until(
+            check,
+            timeout=timeout,
+            interval=interval,
+            max_interval=max_interval,
+        )
+        return reports, sorted(pending)
+
+    def download(self, lang: str) -> bytes:
+        url = getattr(self, f'{lang}_report')
+        with logined_session() as sess:
+            resp = sess.get(url)
+            assert resp.ok, resp.text
+        return resp.content
@@ -1,6 +1,6 @@
 from typing import List
-from .auth import logined_session
 from .config import Config
+from .metacache import MetadataCache
 from .user import User
 
 
@@ -20,11 +20,9 @@ class Course:
 
     @classmethod
     def get_by_name(cls, name: str) -> 'Course':
-        with logined_session() as sess:
-            resp = sess.get(f'{Config.API_BASE}/course/{name}')
-            # TODO: Error handling
-            assert resp.ok, resp.text
-            payload = resp.json()['data']
+        payload = MetadataCache.get(f'{Config.API_BASE}/course/{name}')
+        # TODO: Error handling
+        assert payload is not None, f'Course not found. [name={name}]'
         teacher = User(**payload['teacher'])
         TAs = [User(**t) for t in payload['TAs']]
         students = [User(**s) for s in payload['students']]
@@ -1,11 +1,24 @@
 import csv
 import logging
+import math
+from bisect import bisect_right
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterable, List, Tuple, Optional, Union
+from .batch import SubmissionBatch
 from .submission import Submission
 
 
+def timestamp(d: datetime) -> float:
+    '''
+    Epoch of a naive local datetime, `datetime.max` might be out of range
+    '''
+    try:
+        return d.timestamp()
+    except (OverflowError, OSError, ValueError):
+        return math.inf
+
+
 class MultiDeadLinePolicy:
     '''
     Given submission and deadline-ratio tuple to generate scores
@@ -32,13 +45,10 @@ class MultiDeadLinePolicy:
 
         @property
         def final_score(self):
-            diffs = [
-                self.scores[i] - s
-                for i, s in enumerate([0] + self.scores[:-1])
-            ]
-            final = sum(d * self.deadlines[i][1] / 100
-                        for i, d in enumerate(diffs))
-            return final
+            return MultiDeadLinePolicy.weighted_score(
+                self.scores,
+                self.deadlines,
+            )
 
         def __repr__(self) -> str:
             cls_name = self.__class__.__name__
@@ -48,17 +58,20 @@ class MultiDeadLinePolicy:
 
     def __init__(
         self,
-        submissions: List[Submission],
+        submissions: Union[SubmissionBatch, Iterable[Submission]],
         students: List[str] = None,
         weights: Optional[Dict[int, int]] = None,
         deadlines: List[Tuple[datetime, int]] = [],
         excludes: Optional[List[str]] = None,
     ) -> None:
+        # Store in columns, so the submissions can be streamed
+        if not isinstance(submissions, SubmissionBatch):
+            submissions = SubmissionBatch.from_submissions(submissions)
         if len(submissions) == 0:
             raise ValueError('Empty submissions')
         self.submissions = submissions
         if students is None:
-            students = {s.user.username for s in submissions}
+            students = {*submissions.usernames}
         if excludes is not None:
             if not isinstance(students, set):
                 students = {*students}
@@ -70,7 +83,7 @@ class MultiDeadLinePolicy:
         self.deadlines = deadlines
         # If not specified
         if weights is None:
-            pids = [*{s.problem_id for s in self.submissions}]
+            pids = [*{*self.submissions.problem_ids}]
             weight = 100 // len(pids)
             weights = {pid: weight for pid in pids}
             weights[pids[0]] += (100 - len(pids) * weight)
@@ -78,38 +91,82 @@ class MultiDeadLinePolicy:
 
     def validate(self):
         assert sum(self.weights.values()) == 100, self.weights
-        assert {*self.weights} == {*(s.problem_id for s in self.submissions)}
+        assert {*self.weights} == {*self.submissions.problem_ids}
 
-    def gen_score(self, out: Path):
+    @staticmethod
+    def weighted_score(
+        scores: List[int],
+        deadlines: List[Tuple[datetime, int]],
+    ) -> float:
+        '''
+        Combine high scores before each (sorted) deadline by their ratios
+        '''
+        diffs = [scores[i] - s for i, s in enumerate([0] + scores[:-1])]
+        final = sum(d * deadlines[i][1] / 100 for i, d in enumerate(diffs))
+        return final
+
+    def best_scores(self) -> Dict[Tuple[str, int], List[int]]:
+        '''
+        High score before each deadline, keyed by (username, problem id).
+        Each submission is placed to the first deadline after it by bisect,
+        and the running maximum carries it to the later deadlines.
+        '''
+        times = [timestamp(d[0]) for d in sorted(self.deadlines)]
+        n = len(times)
+        students = {*self.students}
+        best = {}
+        batch = self.submissions
+        for username, pid, created, score in zip(
+                batch.usernames,
+                batch.problem_ids,
+                batch.created,
+                batch.scores,
+        ):
+            i = bisect_right(times, created)
+            # Submitted after all deadlines
+            if i == n or username not in students:
+                continue
+            key = (username, pid)
+            scores = best.get(key)
+            if scores is None:
+                scores = best[key] = [0] * n
+            if score > scores[i]:
+                scores[i] = score
+        for scores in best.values():
+            for i in range(1, n):
+                if scores[i] < scores[i - 1]:
+                    scores[i] = scores[i - 1]
+        return best
+
+    def gen_rows(self) -> List[Dict]:
         self.validate()
-        # student: { pid: score }
-        stu_dict = lambda: {
-            pid: self.ProblemStat(
-                pid,
-                self.deadlines,
-            )
-            for pid in self.weights
-        }
-        scores = {s: stu_dict() for s in self.students}
-        # Update problem
-        for s in self.submissions:
-            u = s.user.username
-            if u in scores:
-                scores[u][s.problem_id].update(s)
-        # Generate csv rows
+        deadlines = sorted(self.deadlines)
+        no_submission = [0] * len(deadlines)
+        best = self.best_scores()
         rows = []
-        for u, stats in scores.items():
-            logging.debug(f'User {u}')
-            for stat in stats.values():
-                logging.debug(repr(stat))
-            total = sum(self.weights[pid] * stat.final_score / 100
-                        for pid, stat in stats.items())
+        for u in self.students:
+            finals = {
+                pid: self.weighted_score(
+                    best.get((u, pid), no_submission),
+                    deadlines,
+                )
+                for pid in self.weights
+            }
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(f'User {u}')
+                for pid in self.weights:
+                    logging.debug(f'{pid}: {best.get((u, pid))}')
+            total = sum(self.weights[pid] * final / 100
+                        for pid, final in finals.items())
             rows.append({
                 'username': u,
-                **{pid: stat.final_score
-                   for pid, stat in stats.items()},
+                **finals,
                 'total': total,
             })
+        return rows
+
+    def gen_score(self, out: Path):
+        rows = self.gen_rows()
         with out.open('w') as f:
             writer = csv.DictWriter(
                 f,
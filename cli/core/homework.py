@@ -1,8 +1,8 @@
 import sys
 from datetime import datetime
 from typing import Any, Dict, List
-from .auth import logined_session
 from .config import Config
+from .metacache import MetadataCache
 
 
 class Homework:
@@ -44,14 +44,13 @@ class Homework:
         course: str,
         name: str,
     ):
-        with logined_session() as sess:
-            url = f'{Config.API_BASE}/course/{course}/homework'
-            hws = sess.get(url).json()['data']
-            try:
-                hw = next(hw for hw in hws if hw['name'] == name)
-            except StopIteration:
-                raise cls.NotFound(
-                    f'Homework not found. [course={course}, name={name}]')
+        url = f'{Config.API_BASE}/course/{course}/homework'
+        hws = MetadataCache.get(url) or []
+        try:
+            hw = next(hw for hw in hws if hw['name'] == name)
+        except StopIteration:
+            raise cls.NotFound(
+                f'Homework not found. [course={course}, name={name}]')
         return cls(
             _id=hw['id'],
             name=hw['name'],
@@ -69,12 +68,9 @@ class Homework:
         '''
         Get single homework by id
         '''
-        with logined_session() as sess:
-            url = f'{Config.API_BASE}/homework/{id}'
-            resp = sess.get(url)
-            if resp.status_code == 404:
-                raise cls.NotFound(f'Homework not found. [id={id}]')
-            hw = resp.json()['data']
+        hw = MetadataCache.get(f'{Config.API_BASE}/homework/{id}')
+        if hw is None:
+            raise cls.NotFound(f'Homework not found. [id={id}]')
         return cls(
             _id=id,
             name=hw['name'],
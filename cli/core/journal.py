@@ -0,0 +1,87 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class CheckpointJournal:
+    '''
+    Append-only record of finished items. Each item costs one line, and the
+    file is fsynced every `sync_every` records, so a killed run loses at most
+    that many records and never corrupts the input it was working on.
+    '''
+
+    def __init__(
+        self,
+        path: Path,
+        sync_every: int = 20,
+    ) -> None:
+        self.path = path
+        self.sync_every = sync_every
+        self.unsynced = 0
+        self._file = None
+
+    def __enter__(self) -> 'CheckpointJournal':
+        self._drop_torn_line()
+        self._file = self.path.open('a')
+        return self
+
+    def _drop_torn_line(self) -> None:
+        '''
+        Truncate the last line if a crash left it without newline, otherwise
+        the next record would be appended to it
+        '''
+        try:
+            f = self.path.open('r+b')
+        except FileNotFoundError:
+            return
+        with f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                logging.debug(f'Drop torn journal line: {data[-80:]!r}')
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def replay(self) -> Dict[str, Optional[str]]:
+        '''
+        Return finished item ids mapped to their error, `None` for success
+        '''
+        finished = {}
+        try:
+            f = self.path.open()
+        except FileNotFoundError:
+            return finished
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line might be torn by a crash
+                    logging.debug(f'Skip broken journal line: {line!r}')
+                    continue
+                finished[record['id']] = record['error']
+        return finished
+
+    def record(self, _id: str, error: Optional[str] = None) -> None:
+        self._file.write(json.dumps({'id': _id, 'error': error}) + '\n')
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.unsynced = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def remove(self) -> None:
+        self.close()
+        self.path.unlink(missing_ok=True)
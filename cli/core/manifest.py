@@ -0,0 +1,50 @@
+import json
+import hashlib
+from pathlib import Path
+from typing import Any, Dict
+from .submission import Submission
+from .util import atomic_write_text
+
+
+class CodeManifest:
+    '''
+    Record downloaded submissions of a code directory, used to skip the
+    ones which are not changed since the last download.
+    '''
+
+    FILENAME = '.manifest.json'
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.path = root / self.FILENAME
+        try:
+            with self.path.open() as f:
+                self.entries: Dict[str, Dict[str, Any]] = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        if not isinstance(self.entries, dict):
+            raise TypeError(f'Invalid manifest {self.path}')
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def is_outdated(self, submission: Submission) -> bool:
+        '''
+        Whether the submission is new or re-sent since the last download
+        '''
+        entry = self.entries.get(submission.id)
+        if entry is None:
+            return True
+        if entry['last_send'] != submission.last_send_timestamp:
+            return True
+        return not (self.root / entry['path']).exists()
+
+    def add(self, submission: Submission, path: Path) -> None:
+        self.entries[submission.id] = {
+            'last_send': submission.last_send_timestamp,
+            'hash': hashlib.sha256(submission.code.encode()).hexdigest(),
+            'path': str(path.relative_to(self.root)),
+        }
+
+    def save(self) -> None:
+        atomic_write_text(self.path, json.dumps(self.entries))
@@ -0,0 +1,117 @@
+import json
+import hashlib
+import logging
+import threading
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Optional
+from .auth import logined_session
+from .config import Config
+from .util import SingleFlight, atomic_write_text
+
+
+class MetadataCache:
+    '''
+    Cache of homework, course and problem payloads keyed by their API URL.
+    Payloads are kept in memory for the whole process and on disk for
+    `Config.METADATA_TTL` seconds, after which they are revalidated by
+    ETag / Last-Modified. Nothing is stored on disk if `Config.PERSIST` is
+    off.
+    '''
+
+    # url -> payload, used by this process without revalidation
+    _memo: Dict[str, Any] = {}
+    # url -> {'data', 'etag', 'last_modified', 'fetched_at'}
+    _entries: Optional[Dict[str, Dict[str, Any]]] = None
+    # Concurrent misses of one URL
+    _requests = SingleFlight()
+    _lock = threading.Lock()
+
+    @classmethod
+    def path(cls) -> Path:
+        root = Config.config_path().parent / 'cache'
+        root.mkdir(exist_ok=True)
+        # Visible data depends on both the instance and the user
+        key = f'{Config.API_BASE}|{Config.curr_user["username"]}'
+        key = hashlib.sha1(key.encode()).hexdigest()[:8]
+        return root / f'metadata-{key}.json'
+
+    @classmethod
+    def _load(cls) -> Dict[str, Dict[str, Any]]:
+        if cls._entries is None:
+            entries = {}
+            if Config.PERSIST:
+                try:
+                    with cls.path().open() as f:
+                        entries = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    pass
+            cls._entries = entries if isinstance(entries, dict) else {}
+        return cls._entries
+
+    @classmethod
+    def _save(cls) -> None:
+        if not Config.PERSIST:
+            return
+        try:
+            atomic_write_text(cls.path(), json.dumps(cls._entries))
+        except OSError as e:
+            logging.debug(f'Failed to store metadata: {e}')
+
+    @classmethod
+    def get(cls, url: str) -> Optional[Any]:
+        '''
+        Get the `data` field of a GET response, return `None` if the server
+        responds 404.
+        '''
+        with cls._lock:
+            if url in cls._memo:
+                return cls._memo[url]
+        return cls._requests.do(url, partial(cls._fetch, url))
+
+    @classmethod
+    def _fetch(cls, url: str) -> Optional[Any]:
+        with cls._lock:
+            entry = cls._load().get(url)
+        if entry is not None and \
+                time.time() - entry['fetched_at'] < Config.METADATA_TTL:
+            cls._memo[url] = entry['data']
+            return entry['data']
+        headers = {}
+        if entry is not None:
+            if entry['etag'] is not None:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified'] is not None:
+                headers['If-Modified-Since'] = entry['last_modified']
+        with logined_session() as sess:
+            resp = sess.get(url, headers=headers)
+        if resp.status_code == 404:
+            cls.invalidate(url)
+            return None
+        if resp.status_code == 304 and entry is not None:
+            logging.debug(f'Not modified: {url}')
+            entry['fetched_at'] = time.time()
+        else:
+            assert resp.ok, resp.text
+            entry = {
+                'data': resp.json()['data'],
+                'etag': resp.headers.get('ETag'),
+                'last_modified': resp.headers.get('Last-Modified'),
+                'fetched_at': time.time(),
+            }
+        with cls._lock:
+            cls._memo[url] = entry['data']
+            cls._entries[url] = entry
+            cls._save()
+        return entry['data']
+
+    @classmethod
+    def invalidate(cls, url: str) -> None:
+        '''
+        Drop the cached payload of `url`, e.g. after it is modified
+        '''
+        with cls._lock:
+            cls._memo.pop(url, None)
+            if cls._load().pop(url, None) is not None:
+                cls._save()
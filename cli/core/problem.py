@@ -3,6 +3,7 @@ from typing import List, Optional, Union
 from .auth import logined_session
 from .config import Config
 from .course import Course
+from .metacache import MetadataCache
 
 
 class Problem:
@@ -14,10 +15,8 @@ class Problem:
 
     @classmethod
     def get_by_id(cls, pid: int):
-        with logined_session() as sess:
-            resp = sess.get(f'{Config.API_BASE}/problem/{pid}')
-            assert resp.ok, resp.text
-            payload = resp.json()['data']
+        payload = MetadataCache.get(f'{Config.API_BASE}/problem/{pid}')
+        assert payload is not None, f'Problem not found. [id={pid}]'
         return cls(**payload, problemId=pid)
 
     @classmethod
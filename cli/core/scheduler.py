@@ -0,0 +1,259 @@
+import logging
+import time
+from collections import defaultdict
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+from .submission import LanguageType, Submission, SubmissionStatus
+from .util import RateLimiter, poll_until
+
+
+class StatusPoller:
+    '''
+    Track pending submissions and check all of them together. Each poll
+    costs one request per problem instead of one per submission.
+
+    A submission counts as judged once it leaves the pending list after it
+    was seen there. One never seen pending is fetched to check that its
+    verdict differs from the one it had when it was tracked, since the
+    server might not have marked it pending yet.
+    '''
+
+    def __init__(
+        self,
+        timeout: float = 300,
+        interval: float = 1,
+        max_interval: float = 30,
+    ) -> None:
+        self.timeout = timeout
+        self.interval = interval
+        self.max_interval = max_interval
+        # submission id -> (problem id, start time)
+        self.pending: Dict[str, Tuple[int, float]] = {}
+        # submission id -> (last send time, status) when it was tracked
+        self.previous: Dict[str, Optional[Tuple[float, int]]] = {}
+        self.seen_pending: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def add(self, submission: Submission) -> None:
+        '''
+        Track a submission about to be rejudged, its current verdict does
+        not count
+        '''
+        self.track(
+            submission.id,
+            submission.problem_id,
+            (submission.last_send_timestamp, submission.status),
+        )
+
+    def track(
+        self,
+        _id: str,
+        problem_id: int,
+        previous: Optional[Tuple[float, int]] = None,
+    ) -> None:
+        '''
+        Track a submission by id, `previous` is the last send time and
+        status to be replaced, `None` if it is not judged yet
+        '''
+        self.pending[_id] = (problem_id, time.monotonic())
+        self.previous[_id] = previous
+
+    def _untrack(self, _id: str) -> None:
+        del self.pending[_id]
+        del self.previous[_id]
+        self.seen_pending.discard(_id)
+
+    def _is_rejudged(self, _id: str) -> bool:
+        '''
+        Whether a submission never seen pending got a new verdict
+        '''
+        try:
+            submission = Submission.get_by_id(_id)
+        except Exception as e:
+            logging.debug(f'Check submission {_id} failed: {e!r}')
+            return False
+        if submission.status == SubmissionStatus.PENDING:
+            self.seen_pending.add(_id)
+            return False
+        if submission.status < 0:
+            return False
+        if self.previous[_id] is None:
+            return True
+        last_send, status = self.previous[_id]
+        return (submission.last_send_timestamp > last_send
+                or submission.status != status)
+
+    def poll(self) -> Tuple[List[str], List[str]]:
+        '''
+        Return ids of submissions which are judged and the ones exceed the
+        timeout since last poll.
+        '''
+        by_problem = defaultdict(set)
+        for _id, (pid, _) in self.pending.items():
+            by_problem[pid].add(_id)
+        judged = []
+        for pid, ids in by_problem.items():
+            try:
+                still_pending = Submission.filter(
+                    problem_id=pid,
+                    status=SubmissionStatus.PENDING,
+                )
+            except Exception as e:
+                logging.debug(f'Poll problem {pid} failed: {e!r}')
+                continue
+            still_pending = {s.id for s in still_pending}
+            self.seen_pending |= ids & still_pending
+            for _id in ids - still_pending:
+                if _id in self.seen_pending or self._is_rejudged(_id):
+                    judged.append(_id)
+        for _id in judged:
+            self._untrack(_id)
+        now = time.monotonic()
+        timeouts = [
+            _id for _id, (_, start) in self.pending.items()
+            if now - start > self.timeout
+        ]
+        for _id in timeouts:
+            self._untrack(_id)
+        return judged, timeouts
+
+    def wait_until(
+        self,
+        fn: Callable[[List[str], List[str]], bool],
+    ) -> None:
+        '''
+        Poll with backoff and pass the result of each poll to `fn`, until it
+        returns `True`. The interval is doubled while nothing finishes.
+        '''
+
+        def check():
+            judged, timeouts = self.poll()
+            return fn(judged, timeouts), bool(judged or timeouts)
+
+        poll_until(
+            check,
+            interval=self.interval,
+            max_interval=self.max_interval,
+        )
+
+    def wait_all(self) -> List[str]:
+        '''
+        Poll until all submissions are judged, return ids of the ones
+        exceed the timeout.
+        '''
+        all_timeouts = []
+
+        def collect(judged: List[str], timeouts: List[str]) -> bool:
+            all_timeouts.extend(timeouts)
+            return len(self) == 0
+
+        self.wait_until(collect)
+        return all_timeouts
+
+
+class RejudgeSummary:
+
+    def __init__(self) -> None:
+        self.succeeded: List[str] = []
+        self.skipped: List[str] = []
+        # submission id -> reason
+        self.failed: Dict[str, str] = {}
+
+    def __str__(self) -> str:
+        lines = [
+            f'Rejudged: {len(self.succeeded)}, '
+            f'skipped: {len(self.skipped)}, '
+            f'failed: {len(self.failed)}',
+        ]
+        lines.extend(f'{_id}: {r}' for _id, r in self.failed.items())
+        return '\n'.join(lines)
+
+
+class RejudgeScheduler:
+    '''
+    Rejudge submissions with a bounded number in flight. The rejudge requests
+    are rate limited and the results are checked by a shared poller with
+    exponential backoff.
+    '''
+
+    def __init__(
+        self,
+        concurrency: int = 10,
+        rate: Optional[float] = 5,
+        timeout: float = 300,
+        interval: float = 1,
+        max_interval: float = 30,
+    ) -> None:
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+        self.timeout = timeout
+        self.interval = interval
+        self.max_interval = max_interval
+
+    def run(
+        self,
+        submissions: Iterable[Submission],
+        on_done: Optional[Callable[[str, Optional[str]], None]] = None,
+    ) -> RejudgeSummary:
+        '''
+        Rejudge all submissions. `on_done(id, error)` is called once a
+        submission is finished, `error` is None if it was rejudged.
+        '''
+        summary = RejudgeSummary()
+        poller = StatusPoller(
+            timeout=self.timeout,
+            interval=self.interval,
+            max_interval=self.max_interval,
+        )
+
+        def done(_id: str, error: Optional[str] = None):
+            if error is None:
+                summary.succeeded.append(_id)
+            else:
+                logging.debug(f'Fail at {_id}: {error}')
+                summary.failed[_id] = error
+            if on_done is not None:
+                on_done(_id, error)
+
+        submissions = iter(submissions)
+
+        def fill():
+            while len(poller) < self.concurrency:
+                s = next(submissions, None)
+                if s is None:
+                    return
+                if (s.status == SubmissionStatus.NO_CODE
+                        or s.language_type == LanguageType.HAND):
+                    summary.skipped.append(s.id)
+                    if on_done is not None:
+                        on_done(s.id, None)
+                    continue
+                self.limiter.acquire()
+                try:
+                    s.trigger_rejudge()
+                except Exception as e:
+                    done(s.id, repr(e))
+                    continue
+                poller.add(s)
+
+        def collect(judged: List[str], timeouts: List[str]) -> bool:
+            for _id in judged:
+                done(_id)
+            for _id in timeouts:
+                done(_id, 'Rejudge timeout')
+            # Keep the poller busy with the next submissions
+            fill()
+            return len(poller) == 0
+
+        fill()
+        poller.wait_until(collect)
+        return summary
@@ -0,0 +1,268 @@
+'''
+Local source similarity check
+
+Sources are normalized to token streams (identifiers, numbers and strings
+lose their values), hashed as k-grams and reduced to fingerprints by
+winnowing. Pairs sharing fingerprints are found through an inverted index,
+so only students that have something in common are compared.
+'''
+import io
+import os
+import re
+import keyword
+import tokenize as py_tokenize
+import zlib
+from collections import defaultdict
+from itertools import combinations
+from multiprocessing import Pool
+from pathlib import Path
+from typing import (
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+from .submission import LanguageType, infer_language
+
+try:
+    from pycparser.c_lexer import CLexer
+except ImportError:
+    CLexer = None
+
+C_KEYWORDS = {
+    *'auto break case char const continue default do double else enum extern'
+    ' float for goto if inline int long register restrict return short'
+    ' signed sizeof static struct switch typedef union unsigned void'
+    ' volatile while'.split(),
+}
+CPP_KEYWORDS = {
+    *C_KEYWORDS,
+    *'bool catch class const_cast delete dynamic_cast explicit false friend'
+    ' mutable namespace new operator private protected public'
+    ' reinterpret_cast static_cast template this throw true try typeid'
+    ' typename using virtual'.split(),
+}
+C_TOKEN_RE = re.compile(
+    r'''
+    (?P<comment>//[^\n]*|/\*.*?\*/|^[ \t]*\#[^\n]*)
+    |(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    |(?P<number>\.?\d[\w.]*)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<op>::|->|<<=|>>=|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||[-+*/%&|^]=|\S)
+    ''',
+    re.S | re.M | re.X,
+)
+PY_TOKEN_RE = re.compile(
+    r'''
+    (?P<comment>\#[^\n]*)
+    |(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    |(?P<number>\.?\d[\w.]*)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<op>\*\*=?|//=?|->|<=|>=|==|!=|:=|[-+*/%&|^@]=|\S)
+    ''',
+    re.X,
+)
+
+# Lexer of the current process, it is expensive to build
+_c_lexer = None
+
+
+def _regex_tokens(
+    code: str,
+    pattern: re.Pattern,
+    keywords: Set[str],
+) -> List[str]:
+    tokens = []
+    for m in pattern.finditer(code):
+        kind = m.lastgroup
+        if kind == 'comment':
+            continue
+        if kind == 'string':
+            tokens.append('S')
+        elif kind == 'number':
+            tokens.append('N')
+        elif kind == 'name':
+            tokens.append(m[0] if m[0] in keywords else 'V')
+        else:
+            tokens.append(m[0])
+    return tokens
+
+
+def _c_lexer_tokens(code: str) -> List[str]:
+    '''
+    Tokenize C by pycparser, raise `ValueError` on lexing error
+    '''
+    global _c_lexer
+    if _c_lexer is None:
+
+        def error(msg, *args):
+            raise ValueError(msg)
+
+        _c_lexer = CLexer(
+            error_func=error,
+            on_lbrace_func=lambda: None,
+            on_rbrace_func=lambda: None,
+            type_lookup_func=lambda name: False,
+        )
+        # pycparser < 3 is built on ply
+        if hasattr(_c_lexer, 'build'):
+            _c_lexer.build(optimize=False)
+    # The lexer does not accept comments and directives
+    code = C_TOKEN_RE.sub(
+        lambda m: ' ' if m.lastgroup == 'comment' else m[0],
+        code,
+    )
+    _c_lexer.input(code)
+    tokens = []
+    for tok in iter(_c_lexer.token, None):
+        if tok.type == 'ID':
+            tokens.append('V')
+        elif tok.type in ('STRING_LITERAL', 'CHAR_CONST'):
+            tokens.append('S')
+        elif 'CONST' in tok.type:
+            tokens.append('N')
+        else:
+            # Same vocabulary as the regex tokenizer
+            tokens.append(tok.value)
+    return tokens
+
+
+def _python_tokens(code: str) -> List[str]:
+    tokens = []
+    readline = io.StringIO(code).readline
+    for tok in py_tokenize.generate_tokens(readline):
+        if tok.type == py_tokenize.NAME:
+            tokens.append(tok.string if keyword.iskeyword(tok.string) else 'V')
+        elif tok.type == py_tokenize.NUMBER:
+            tokens.append('N')
+        elif tok.type == py_tokenize.STRING:
+            tokens.append('S')
+        elif tok.type == py_tokenize.OP:
+            tokens.append(tok.string)
+        elif tok.type in (py_tokenize.INDENT, py_tokenize.DEDENT):
+            tokens.append(py_tokenize.tok_name[tok.type])
+    return tokens
+
+
+def normalize(
+    code: str,
+    lang: LanguageType,
+    pycparser: bool = False,
+) -> List[str]:
+    '''
+    Token stream of source code, with identifiers, numbers and strings
+    replaced by placeholders. C is tokenized by pycparser if `pycparser` is
+    set, it is more accurate but several times slower than the regex.
+    '''
+    if lang == LanguageType.PY3:
+        try:
+            return _python_tokens(code)
+        except (py_tokenize.TokenError, SyntaxError):
+            return _regex_tokens(code, PY_TOKEN_RE, {*keyword.kwlist})
+    if lang == LanguageType.C and pycparser:
+        try:
+            return _c_lexer_tokens(code)
+        except ValueError:
+            pass
+    keywords = C_KEYWORDS if lang == LanguageType.C else CPP_KEYWORDS
+    return _regex_tokens(code, C_TOKEN_RE, keywords)
+
+
+def winnow(tokens: List[str], k: int = 5, window: int = 4) -> Set[int]:
+    '''
+    Fingerprints of a token stream: the minimum hash of every `window`
+    consecutive k-grams
+    '''
+    if len(tokens) < k:
+        k = len(tokens)
+        if k == 0:
+            return set()
+    # crc32 is stable across processes, unlike `hash`
+    hashes = [
+        zlib.crc32(' '.join(tokens[i:i + k]).encode())
+        for i in range(len(tokens) - k + 1)
+    ]
+    if len(hashes) <= window:
+        return {min(hashes)}
+    return {min(hashes[i:i + window]) for i in range(len(hashes) - window + 1)}
+
+
+# (path, k, window, pycparser) passed to worker processes
+FingerprintJob = Tuple[Path, int, int, bool]
+
+
+def fingerprint_file(args: FingerprintJob) -> Tuple[Path, Set[int]]:
+    path, k, window, pycparser = args
+    code = path.read_text(errors='replace')
+    tokens = normalize(code, infer_language(path.name), pycparser)
+    return path, winnow(tokens, k, window)
+
+
+def fingerprint_files(
+    paths: Iterable[Path],
+    k: int = 5,
+    window: int = 4,
+    jobs: Optional[int] = None,
+    pycparser: bool = False,
+) -> Dict[Path, Set[int]]:
+    '''
+    Fingerprint files with `jobs` processes, default to the number of CPUs
+    '''
+    if pycparser and CLexer is None:
+        raise ImportError('pycparser is not installed')
+    args = [(path, k, window, pycparser) for path in paths]
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs == 1:
+        return dict(map(fingerprint_file, args))
+    with Pool(jobs) as pool:
+        return dict(pool.imap_unordered(fingerprint_file, args, chunksize=16))
+
+
+class SimilarityIndex:
+    '''
+    Inverted index from fingerprint to documents
+    '''
+
+    # Fingerprints shared by this many documents are always considered rare
+    MIN_DF_LIMIT = 5
+
+    def __init__(self) -> None:
+        self.fingerprints: Dict[Hashable, Set[int]] = {}
+        self.postings: Dict[int, List[Hashable]] = defaultdict(list)
+
+    def add(self, key: Hashable, fingerprints: Set[int]) -> None:
+        self.fingerprints[key] = fingerprints
+        for f in fingerprints:
+            self.postings[f].append(key)
+
+    def pairs(
+        self,
+        max_df: float = 0.05,
+        min_similarity: float = 0,
+    ) -> List[Tuple[Hashable, Hashable, int, float]]:
+        '''
+        Return `(a, b, shared, similarity)` of similar documents, most similar
+        first. Similarity is the shared part of the smaller document.
+
+        Only documents sharing a rare fingerprint are compared. Fingerprints
+        found in more than `max_df` of the documents (and more than
+        `MIN_DF_LIMIT` ones) usually come from given templates or idioms.
+        '''
+        limit = max(self.MIN_DF_LIMIT, max_df * len(self.fingerprints))
+        candidates = set()
+        for keys in self.postings.values():
+            if len(keys) <= limit:
+                candidates.update(combinations(keys, 2))
+        result = []
+        for a, b in candidates:
+            fa, fb = self.fingerprints[a], self.fingerprints[b]
+            shared = len(fa & fb)
+            similarity = shared / min(len(fa), len(fb))
+            if similarity >= min_similarity:
+                result.append((a, b, shared, similarity))
+        result.sort(key=lambda r: (-r[3], -r[2]))
+        return result
@@ -1,23 +1,33 @@
 import enum
+import io
 import logging
+import sqlite3
 from pathlib import Path
 import sys
-import tempfile
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from zipfile import ZipFile
+from functools import partial
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
 from typing import (
     Any,
+    Callable,
     Dict,
+    Generator,
+    Iterable,
     List,
     Literal,
     Optional,
+    Sequence,
+    Tuple,
     Union,
 )
 
 from .config import Config
 from .auth import logined_session
 from .user import User
+from . import util
 
 
 class LanguageType(enum.IntEnum):
@@ -27,6 +37,56 @@ class LanguageType(enum.IntEnum):
     HAND = 3
 
 
+class SubmissionStatus(enum.IntEnum):
+    NO_CODE = -2
+    PENDING = -1
+    AC = 0
+    WA = 1
+    CE = 2
+    TLE = 3
+    MLE = 4
+    RE = 5
+    JE = 6
+    OLE = 7
+
+
+def infer_language(name: str) -> LanguageType:
+    '''
+    Determine language by source filename extension
+    '''
+    if name.endswith('.c'):
+        return LanguageType.C
+    if name.endswith('.cpp'):
+        return LanguageType.CPP
+    if name.endswith('.py'):
+        return LanguageType.PY3
+    raise ValueError(f'Unknown file extension: {name}')
+
+
+# Sources smaller than this are stored without compression, deflating
+# them costs more time than the bytes it saves
+COMPRESS_THRESHOLD = 4096
+
+
+def pack_code(code: Union[str, Path], lang: LanguageType) -> bytes:
+    '''
+    Build the zip archive uploaded as submission code in memory. `code` is
+    either the source or a path to it, which is streamed into the archive.
+    '''
+    if isinstance(code, Path):
+        size = code.stat().st_size
+    else:
+        size = len(code)
+    compression = ZIP_DEFLATED if size >= COMPRESS_THRESHOLD else ZIP_STORED
+    buf = io.BytesIO()
+    with ZipFile(buf, 'w', compression=compression) as zf:
+        if isinstance(code, Path):
+            zf.write(code, filename(lang))
+        else:
+            zf.writestr(filename(lang), code)
+    return buf.getvalue()
+
+
 def filename(lang: LanguageType):
     if lang == LanguageType.C:
         return 'main.c'
@@ -44,6 +104,24 @@ class Submission:
         def __init__(self) -> None:
             pass
 
+    __slots__ = (
+        'id',
+        'user',
+        'last_send_timestamp',
+        'created_timestamp',
+        'memory_usage',
+        'problem_id',
+        'run_time',
+        'score',
+        'status',
+        'language_type',
+        'tasks',
+        'code',
+    )
+
+    # Concurrent lookups of one submission id
+    _lookups = util.SingleFlight()
+
     # TODO: use Enum to define status
     def __init__(
         self,
@@ -61,8 +139,9 @@ class Submission:
         code: Optional[Union[str, bool]] = None,
     ) -> None:
         self.id = _id
-        self.last_send = datetime.fromtimestamp(last_send)
-        self.created = datetime.fromtimestamp(created)
+        # Keep epoch values, datetime objects are created on access
+        self.last_send_timestamp = last_send
+        self.created_timestamp = created
         self.memory_usage = memory_usage
         self.problem_id = problem_id
         self.run_time = run_time
@@ -72,24 +151,48 @@ class Submission:
         self.tasks = tasks
         self.code = code
         if isinstance(user, Dict):
-            user = User(**user)
+            user = User.intern(user)
         self.user = user
 
+    @property
+    def last_send(self) -> datetime:
+        return datetime.fromtimestamp(self.last_send_timestamp)
+
+    @last_send.setter
+    def last_send(self, value: datetime) -> None:
+        self.last_send_timestamp = value.timestamp()
+
+    @property
+    def created(self) -> datetime:
+        return datetime.fromtimestamp(self.created_timestamp)
+
+    @created.setter
+    def created(self, value: datetime) -> None:
+        self.created_timestamp = value.timestamp()
+
     def __str__(self) -> str:
         return f'Submission [{self.id}]'
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user': self.user.to_dict(),
-            'status': self.status,
-            'run_time': self.run_time,
-            'memory_usage': self.memory_usage,
-            'score': self.score,
-            'problem_id': self.problem_id,
-            'code': self.code,
-            'last_send': self.last_send.isoformat(),
-        }
+    # Field name -> getter used by `to_dict`
+    DICT_FIELDS = {
+        'id': lambda s: s.id,
+        'user': lambda s: s.user.to_dict(),
+        'status': lambda s: s.status,
+        'run_time': lambda s: s.run_time,
+        'memory_usage': lambda s: s.memory_usage,
+        'score': lambda s: s.score,
+        'problem_id': lambda s: s.problem_id,
+        'code': lambda s: s.code,
+        'last_send': lambda s: s.last_send.isoformat(),
+    }
+
+    def to_dict(self, fields: Optional[Sequence[str]] = None):
+        '''
+        Convert to dict, only the given `fields` are computed if specified
+        '''
+        if fields is None:
+            fields = self.DICT_FIELDS
+        return {f: self.DICT_FIELDS[f](self) for f in fields}
 
     @classmethod
     def load_payload(cls, p: Dict[str, Any]) -> 'Submission':
@@ -116,8 +219,57 @@ class Submission:
         return cls.load_payload(resp.json()['data'])
 
     @classmethod
-    def filter(
+    def _get_shared(cls, _id: str) -> 'Submission':
+        '''
+        Same as `get_by_id`, but concurrent lookups of one id share a request
+        '''
+        return cls._lookups.do(_id, partial(cls.get_by_id, _id))
+
+    @classmethod
+    def get_many(
         cls,
+        ids: Iterable[str],
+        jobs: int = 8,
+        retry: int = 0,
+        ordered: bool = True,
+    ) -> Generator[Tuple[str, Optional['Submission'], Optional[Exception]],
+                   None, None]:
+        '''
+        Get submissions by ids concurrently, and yield `(id, submission,
+        error)` once for each distinct id. Results follow the input order if
+        `ordered`, otherwise they are yielded as soon as they complete.
+        '''
+        # There is no bulk endpoint, so ids are fetched one by one over the
+        # shared session
+        order = deque()
+        seen = set()
+
+        def unique():
+            for _id in ids:
+                if _id in seen:
+                    continue
+                seen.add(_id)
+                order.append(_id)
+                yield _id
+
+        results = util.concurrent_map(
+            cls._get_shared,
+            unique(),
+            jobs=jobs,
+            retry=retry,
+        )
+        if not ordered:
+            yield from results
+            return
+        done = {}
+        for _id, submission, error in results:
+            done[_id] = (submission, error)
+            while order and order[0] in done:
+                _id = order.popleft()
+                yield (_id, *done.pop(_id))
+
+    @staticmethod
+    def _filter_params(
         course: Optional[str] = None,
         tags: List[str] = [],
         problem_id: Optional[int] = None,
@@ -125,20 +277,14 @@ class Submission:
         user: Optional[Union[str, User]] = None,
         after: Optional[datetime] = None,
         status: Optional[int] = None,
-    ) -> List['Submission']:
-        '''
-        Get submission by parameter
-        '''
-        params = {
-            'offset': 0,
-            'count': -1,
-        }
+    ) -> Dict[str, Any]:
+        params = {}
         if course is not None:
             params['course'] = course
         if problem_id is not None:
             params['problemId'] = problem_id
         if status is not None:
-            params['status'] = status
+            params['status'] = int(status)
         if user is not None:
             if isinstance(user, str):
                 params['username'] = user
@@ -150,14 +296,164 @@ class Submission:
             params['before'] = int(before.timestamp())
         if after is not None:
             params['after'] = int(after.timestamp())
+        return params
+
+    @classmethod
+    def _fetch_page(
+        cls,
+        params: Dict[str, Any],
+        offset: int,
+        count: int,
+    ) -> List[Dict[str, Any]]:
         with logined_session() as sess:
-            submissions = sess.get(
+            resp = sess.get(
                 f'{Config.API_BASE}/submission',
-                params=params,
-            ).json()['data']['submissions']
+                params={
+                    **params,
+                    'offset': offset,
+                    'count': count,
+                },
+            )
+            assert resp.ok, resp.text
+            return resp.json()['data']['submissions']
+
+    @classmethod
+    def _local_query(
+        cls,
+        params: Dict[str, Any],
+    ) -> Optional[Generator['Submission', None, None]]:
+        '''
+        Return submissions from local cache, or `None` if the cache can not
+        answer this query.
+        '''
+        from .cache import SubmissionCache
+        cache = SubmissionCache.open_existing()
+        if cache is None:
+            return None
+        try:
+            covered = cache.covers(params)
+        except sqlite3.Error as e:
+            logging.debug(f'Skip submission cache: {e}')
+            covered = False
+        if not covered:
+            cache.conn.close()
+            return None
+        logging.debug(f'Query submissions from {cache.path}')
+
+        def query():
+            with cache:
+                yield from map(cls.load_payload, cache.query(params))
+
+        return query()
+
+    @classmethod
+    def filter(
+        cls,
+        course: Optional[str] = None,
+        tags: List[str] = [],
+        problem_id: Optional[int] = None,
+        before: Optional[datetime] = None,
+        user: Optional[Union[str, User]] = None,
+        after: Optional[datetime] = None,
+        status: Optional[int] = None,
+        cached: bool = False,
+    ) -> List['Submission']:
+        '''
+        Get submission by parameter. If `cached` is set, the query is
+        answered by local cache when it has been synced.
+        '''
+        params = cls._filter_params(
+            course=course,
+            tags=tags,
+            problem_id=problem_id,
+            before=before,
+            user=user,
+            after=after,
+            status=status,
+        )
+        if cached:
+            local = cls._local_query(params)
+            if local is not None:
+                return list(local)
+        submissions = cls._fetch_page(params, 0, -1)
         submissions = map(cls.load_payload, submissions)
         return list(submissions)
 
+    @classmethod
+    def iter_filter(
+        cls,
+        course: Optional[str] = None,
+        tags: List[str] = [],
+        problem_id: Optional[int] = None,
+        before: Optional[datetime] = None,
+        user: Optional[Union[str, User]] = None,
+        after: Optional[datetime] = None,
+        status: Optional[int] = None,
+        page_size: int = 1000,
+        prefetch: bool = True,
+        cached: bool = False,
+    ) -> Generator['Submission', None, None]:
+        '''
+        Same as `filter`, but walk through the result page by page. The next
+        page is fetched in background while the current one is consumed if
+        `prefetch` is set.
+        '''
+        if page_size <= 0:
+            raise ValueError('page_size should be positive')
+        params = cls._filter_params(
+            course=course,
+            tags=tags,
+            problem_id=problem_id,
+            before=before,
+            user=user,
+            after=after,
+            status=status,
+        )
+        if cached:
+            local = cls._local_query(params)
+            if local is not None:
+                yield from local
+                return
+        fetch = partial(cls._fetch_page, params, count=page_size)
+        seen = set()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            offset = 0
+            page = executor.submit(fetch, offset)
+            while True:
+                submissions = page.result()
+                offset += page_size
+                last = len(submissions) < page_size
+                if not last and prefetch:
+                    page = executor.submit(fetch, offset)
+                for p in submissions:
+                    # New submissions shift the listing during the walk, so
+                    # rows at page boundaries may be repeated
+                    if p['submissionId'] in seen:
+                        continue
+                    seen.add(p['submissionId'])
+                    yield cls.load_payload(p)
+                if last:
+                    break
+                if not prefetch:
+                    page = executor.submit(fetch, offset)
+
+    def trigger_rejudge(self):
+        '''
+        Send rejudge request without waiting for the result
+        '''
+        with logined_session() as sess:
+            resp = sess.get(f'{Config.API_BASE}/submission/{self.id}/rejudge')
+            assert resp.ok, resp.text
+        # The cached result is outdated until the next sync
+        from .cache import SubmissionCache
+        cache = SubmissionCache.open_existing()
+        if cache is not None:
+            with cache:
+                try:
+                    cache.mark_pending(self.id)
+                except sqlite3.Error as e:
+                    logging.debug(f'Failed to update submission cache: {e}')
+
     def rejudge(
         self,
         max_retry: int = 20,
@@ -166,9 +462,8 @@ class Submission:
         if self.language_type == LanguageType.HAND:
             logging.warning('Rejudge a handwriten submission')
             return
+        self.trigger_rejudge()
         with logined_session() as sess:
-            resp = sess.get(f'{Config.API_BASE}/submission/{self.id}/rejudge')
-            assert resp.ok, resp.text
             # Check rejudge result
             for _ in range(max_retry):
                 resp = sess.get(f'{Config.API_BASE}/submission/{self.id}')
@@ -180,19 +475,14 @@ class Submission:
                 raise RuntimeError('Rejudge fail')
 
     @classmethod
-    def submit(
+    def create(
         cls,
         problem_id: int,
         lang: LanguageType,
-        code_path: Union[Path, Literal['-']],
-    ):
-        if isinstance(code_path, Path):
-            code = code_path.read_text()
-        elif code_path == '-':
-            code = sys.stdin.read()
-        else:
-            raise ValueError(f'\'code_path\' should be a Path or \'-\'')
-        source_name = filename(lang)
+    ) -> str:
+        '''
+        Create a submission without code, return its id
+        '''
         with logined_session() as sess:
             resp = sess.post(
                 f'{Config.API_BASE}/submission',
@@ -201,22 +491,98 @@ class Submission:
                     'problemId': problem_id,
                 },
             )
-            r_data = resp.json()
-            if resp.status_code == 403:
-                raise PermissionError(r_data['message'])
-            elif resp.status_code in {404, 400}:
-                raise ValueError(r_data['message'])
-            submission_id = r_data['data']['submissionId']
-            logging.debug(f'submission created [id={submission_id}]')
-            with tempfile.NamedTemporaryFile() as tf:
-                with ZipFile(tf, 'w') as zf:
-                    zf.writestr(source_name, code)
-                tf.seek(0)
-                resp = sess.put(
-                    f'{Config.API_BASE}/submission/{submission_id}',
-                    files={'code': tf},
-                )
-                if resp.status_code != 200:
-                    print(resp.json())
-                    return False
-        return True
+        r_data = resp.json()
+        if resp.status_code == 403:
+            raise PermissionError(r_data['message'])
+        elif resp.status_code in {404, 400}:
+            raise ValueError(r_data['message'])
+        assert resp.ok, resp.text
+        submission_id = r_data['data']['submissionId']
+        logging.debug(f'submission created [id={submission_id}]')
+        return submission_id
+
+    @classmethod
+    def upload(cls, _id: str, archive: bytes):
+        '''
+        Upload zipped code of a created submission
+        '''
+        with logined_session() as sess:
+            resp = sess.put(
+                f'{Config.API_BASE}/submission/{_id}',
+                files={'code': ('code.zip', archive)},
+            )
+            assert resp.ok, resp.text
+
+    @classmethod
+    def submit_code(
+        cls,
+        problem_id: int,
+        lang: LanguageType,
+        code: Union[str, Path],
+    ) -> str:
+        '''
+        Submit source code or a source file, return the submission id
+        '''
+        archive = pack_code(code, lang)
+        submission_id = cls.create(problem_id, lang)
+        cls.upload(submission_id, archive)
+        return submission_id
+
+    @classmethod
+    def submit(
+        cls,
+        problem_id: int,
+        lang: LanguageType,
+        code_path: Union[Path, Literal['-']],
+    ) -> Optional[str]:
+        '''
+        Submit code from a file or stdin, return the submission id, or
+        `None` if upload fails
+        '''
+        if isinstance(code_path, Path):
+            code = code_path
+        elif code_path == '-':
+            code = sys.stdin.read()
+        else:
+            raise ValueError(f'\'code_path\' should be a Path or \'-\'')
+        archive = pack_code(code, lang)
+        submission_id = cls.create(problem_id, lang)
+        try:
+            cls.upload(submission_id, archive)
+        except AssertionError as e:
+            print(e)
+            return None
+        return submission_id
+
+    @classmethod
+    def wait_result(
+        cls,
+        _id: str,
+        timeout: float = 300,
+        interval: float = 0.25,
+        max_interval: float = 2,
+        on_poll: Optional[Callable[[float], None]] = None,
+    ) -> 'Submission':
+        '''
+        Poll a submission until it is judged. Polls are fast at first and
+        back off to `max_interval`, `on_poll` receives the elapsed seconds
+        after each poll.
+        '''
+        submission = None
+
+        def judged():
+            nonlocal submission
+            submission = cls.get_by_id(_id)
+            return submission.status != SubmissionStatus.PENDING, False
+
+        finished = util.poll_until(
+            judged,
+            timeout=timeout,
+            interval=interval,
+            max_interval=max_interval,
+            factor=1.5,
+            on_poll=on_poll,
+        )
+        if not finished:
+            raise TimeoutError(f'Judge timeout [id={_id}]')
+        return submission
@@ -0,0 +1,105 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union
+from .config import Config
+from .util import RateLimiter
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, fallback to per-process limit
+    fcntl = None
+
+
+class SharedRateLimiter:
+    '''
+    Token bucket shared by all processes on this host through a locked state
+    file under NOJ_HOME. Callers reserve a token under the file lock and wait
+    for it after releasing the lock.
+    '''
+
+    def __init__(
+        self,
+        path: Path,
+        rate: float,
+        burst: int = 1,
+    ) -> None:
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+
+    def acquire(self) -> None:
+        with self.path.open('a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read())
+                    tokens, updated = state['tokens'], state['updated']
+                except (ValueError, KeyError, TypeError):
+                    tokens, updated = float(self.burst), time.time()
+                now = time.time()
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                tokens -= 1
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({'tokens': tokens, 'updated': now}))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        if tokens < 0:
+            time.sleep(-tokens / self.rate)
+
+
+class Throttle:
+    '''
+    Request budget of the shared session: at most `rate` requests per second
+    and `max_in_flight` concurrent ones. With scope 'host', the rate is shared
+    with other `noj` processes using the same NOJ_HOME.
+    '''
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: int = 1,
+        max_in_flight: Optional[int] = None,
+        scope: str = 'process',
+    ) -> None:
+        if scope not in ('process', 'host'):
+            raise ValueError(f'Invalid rate limit scope: {scope}')
+        self.limiter: Union[RateLimiter, SharedRateLimiter]
+        if rate is not None and scope == 'host' and fcntl is not None:
+            path = Config.config_path().parent / '.ratelimit.lock'
+            self.limiter = SharedRateLimiter(path, rate, burst)
+        else:
+            if scope == 'host':
+                logging.debug('Fallback to per-process rate limit')
+            self.limiter = RateLimiter(rate, burst)
+        self.in_flight = None
+        if max_in_flight is not None:
+            self.in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    @classmethod
+    def from_config(cls) -> 'Throttle':
+        return cls(
+            rate=Config.RATE_LIMIT,
+            burst=Config.RATE_BURST,
+            max_in_flight=Config.MAX_IN_FLIGHT,
+            scope=Config.RATE_LIMIT_SCOPE,
+        )
+
+    @contextmanager
+    def slot(self):
+        '''
+        Wait for the budget of one request
+        '''
+        self.limiter.acquire()
+        if self.in_flight is None:
+            yield
+            return
+        with self.in_flight:
+            yield
@@ -0,0 +1,99 @@
+import json
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import IO, Dict, List, Optional
+from .config import Config
+from .util import format_table
+
+# Path segments replaced by `{id}` in endpoint templates
+ID_PATTERN = re.compile(r'^(\d+|[0-9a-f]{24})$')
+
+
+def endpoint_template(url: str) -> str:
+    '''
+    Turn a request URL into an endpoint template,
+    e.g. `/submission/{id}` for `<API_BASE>/submission/6350...`
+    '''
+    path = url.split('?', 1)[0]
+    base = Config.API_BASE.rstrip('/')
+    if path.startswith(base):
+        path = path[len(base):]
+    segments = [
+        '{id}' if ID_PATTERN.match(s) else s for s in path.split('/') if s
+    ]
+    return '/' + '/'.join(segments)
+
+
+def percentile(values: List[float], p: float) -> float:
+    '''
+    Nearest-rank percentile of sorted values
+    '''
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+class Tracer:
+    '''
+    Record every API request sent by the shared session. Records are written
+    to `out` as JSON lines if given, and latency is kept for `report`.
+    '''
+
+    # Tracer used by the shared session, `None` to disable tracing
+    current: Optional['Tracer'] = None
+
+    def __init__(self, out: Optional[IO[str]] = None) -> None:
+        self.out = out
+        self.logins = 0
+        # endpoint -> latencies in seconds
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        status: Optional[int],
+        size: int,
+        latency: float,
+        retry: int,
+    ) -> None:
+        endpoint = f'{method} {endpoint_template(url)}'
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            if self.out is not None:
+                self.out.write(
+                    json.dumps({
+                        'time': time.time(),
+                        'method': method,
+                        'endpoint': endpoint_template(url),
+                        'status': status,
+                        'bytes': size,
+                        'latency': latency,
+                        'retry': retry,
+                    }) + '\n')
+
+    def count_login(self) -> None:
+        with self._lock:
+            self.logins += 1
+
+    def report(self) -> str:
+        rows = []
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            rows.append([
+                endpoint,
+                len(latencies),
+                *(f'{percentile(latencies, p) * 1000:.1f}'
+                  for p in (50, 95, 99)),
+            ])
+        table = format_table(
+            ['ENDPOINT', 'COUNT', 'P50(ms)', 'P95(ms)', 'P99(ms)'],
+            rows,
+        )
+        return f'{table}\nLogins: {self.logins}'
+
+    def close(self) -> None:
+        if self.out is not None:
+            self.out.close()
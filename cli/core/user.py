@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Any, Dict, Optional
 
 
 class User:
@@ -6,6 +6,16 @@ class User:
     User info object
     '''
 
+    __slots__ = (
+        'username',
+        'md5',
+        'role',
+        'displayed_name',
+    )
+
+    # username -> User, shared by all objects loaded in this run
+    _registry: Dict[str, 'User'] = {}
+
     def __init__(
         self,
         username: str,
@@ -19,6 +29,20 @@ class User:
         self.role = role
         self.displayed_name = displayed_name or displayedName
 
+    @classmethod
+    def intern(cls, payload: Dict[str, Any]) -> 'User':
+        '''
+        Return the shared User object of this payload, so that a student with
+        hundreds of submissions only costs one object.
+        '''
+        user = cls._registry.get(payload['username'])
+        if user is None:
+            user = cls._registry.setdefault(
+                payload['username'],
+                cls(**payload),
+            )
+        return user
+
     def to_dict(self):
         return {
             k: getattr(self, k)
@@ -1,6 +1,30 @@
-from typing import Generator, Iterable, List, TypeVar
+import logging
+import os
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
 T = TypeVar('T')
+R = TypeVar('R')
 
 
 def chunker_list(
@@ -17,3 +41,169 @@ def chunker_list(
             yield ret
             break
         yield ret
+
+
+def concurrent_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    jobs: int = 1,
+    retry: int = 0,
+) -> Generator[Tuple[T, Optional[R], Optional[Exception]], None, None]:
+    '''
+    Call `func` on each item with at most `jobs` calls in flight, and yield
+    `(item, result, error)` in completion order. A failed call is retried at
+    most `retry` times before its last error is yielded.
+    '''
+
+    def call(item: T) -> R:
+        for i in range(retry + 1):
+            try:
+                return func(item)
+            except Exception as e:
+                if i == retry:
+                    raise
+                logging.debug(f'Retry {item} ({i + 1}/{retry}): {e!r}')
+
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending: Dict[Future, T] = {}
+        while True:
+            # Keep the pool busy without consuming the whole input
+            for item in items:
+                pending[executor.submit(call, item)] = item
+                if len(pending) >= jobs * 2:
+                    break
+            if len(pending) == 0:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    yield item, future.result(), None
+                else:
+                    yield item, None, error
+
+
+def poll_until(
+    fn: Callable[[], Tuple[bool, bool]],
+    timeout: Optional[float] = None,
+    interval: float = 1,
+    max_interval: float = 30,
+    factor: float = 2,
+    on_poll: Optional[Callable[[float], None]] = None,
+) -> bool:
+    '''
+    Call `fn` until it returns `(done, progressed)` with `done` set, return
+    `False` if `timeout` seconds pass first. The interval between calls is
+    multiplied by `factor` up to `max_interval`, and reset to `interval`
+    once `fn` makes progress. `on_poll` receives the elapsed seconds after
+    each unfinished call.
+    '''
+    start = time.monotonic()
+    delay = interval
+    while True:
+        done, progressed = fn()
+        if done:
+            return True
+        elapsed = time.monotonic() - start
+        if on_poll is not None:
+            on_poll(elapsed)
+        if progressed:
+            delay = interval
+        if timeout is not None:
+            if elapsed >= timeout:
+                return False
+            time.sleep(min(delay, timeout - elapsed))
+        else:
+            time.sleep(delay)
+        delay = min(delay * factor, max_interval)
+
+
+def format_table(
+    header: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+) -> str:
+    '''
+    Format rows into left-aligned columns
+    '''
+    rows = [[str(c) for c in row] for row in [header, *rows]]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    lines = ('  '.join(map(str.ljust, row, widths)).rstrip() for row in rows)
+    return '\n'.join(lines)
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    '''
+    Write `text` to `path` through a temporary file, so readers never see a
+    partially written file.
+    '''
+    tmp = path.with_name(f'.{path.name}.tmp')
+    with tmp.open('w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(path)
+
+
+class RateLimiter:
+    '''
+    Token bucket allowing `rate` acquisitions per second on average and at
+    most `burst` at once. A `None` rate means unlimited.
+    '''
+
+    def __init__(
+        self,
+        rate: Optional[float],
+        burst: int = 1,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst,
+                self.tokens + (now - self.updated) * self.rate,
+            )
+            self.updated = now
+            self.tokens -= 1
+            # Negative tokens are paid by waiting, the lock is held so that
+            # later callers queue behind this one
+            if self.tokens < 0:
+                time.sleep(-self.tokens / self.rate)
+
+
+class SingleFlight:
+    '''
+    Share one call among concurrent callers with the same key. The first
+    caller runs the function, the others wait for its result or exception.
+    '''
+
+    def __init__(self) -> None:
+        # key -> future of the call in flight
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], R]) -> R:
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            future.set_result(func())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return future.result()
@@ -0,0 +1,89 @@
+'''
+Benchmark MultiDeadLinePolicy scoring on synthetic data
+
+Usage: python scripts/bench_grade.py [students] [problems] [submissions]
+'''
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from cli.core.batch import SubmissionBatch
+from cli.core.grade import MultiDeadLinePolicy
+
+
+def naive_rows(policy: MultiDeadLinePolicy):
+    # The per-deadline scan used before the bisect engine
+    scores = {
+        u: {
+            pid: policy.ProblemStat(pid, policy.deadlines)
+            for pid in policy.weights
+        }
+        for u in policy.students
+    }
+    for s in policy.submissions:
+        if s.user.username in scores:
+            scores[s.user.username][s.problem_id].update(s)
+    rows = []
+    for u, stats in scores.items():
+        row = {pid: stat.final_score for pid, stat in stats.items()}
+        total = sum(policy.weights[pid] * score / 100
+                    for pid, score in row.items())
+        rows.append({'username': u, **row, 'total': total})
+    return rows
+
+
+def random_payload(u, pid, i, start):
+    timestamp = start + timedelta(minutes=random.randrange(30 * 24 * 60))
+    return {
+        'submissionId': f'{u}-{pid}-{i}',
+        'user': {
+            'username': f'student{u}',
+            'md5': '',
+            'role': 2,
+        },
+        'problemId': pid,
+        'lastSend': 0,
+        'timestamp': timestamp.timestamp(),
+        'memoryUsage': 0,
+        'runTime': 0,
+        'score': random.randrange(101),
+        'status': 0,
+        'languageType': 0,
+    }
+
+
+def main(students=500, problems=20, submissions=50):
+    random.seed(0)
+    start = datetime(2022, 9, 1)
+    deadlines = [(start + timedelta(days=d), r)
+                 for d, r in ((7, 100), (14, 80), (21, 60), (28, 30))]
+    batch = SubmissionBatch.from_payloads(
+        random_payload(u, pid, i, start) for u in range(students)
+        for pid in range(problems) for i in range(submissions))
+    weights = {pid: 100 // problems for pid in range(problems)}
+    weights[0] += 100 - sum(weights.values())
+    policy = MultiDeadLinePolicy(
+        batch,
+        students=[f'student{u}' for u in range(students)],
+        deadlines=deadlines,
+        weights=weights,
+    )
+    print(f'{len(batch)} submissions, {len(deadlines)} deadlines')
+    t = time.perf_counter()
+    expected = naive_rows(policy)
+    naive = time.perf_counter() - t
+    t = time.perf_counter()
+    rows = policy.gen_rows()
+    fast = time.perf_counter() - t
+    assert rows == expected
+    print(f'naive:  {naive:.3f}s')
+    print(f'bisect: {fast:.3f}s ({naive / fast:.1f}x)')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,106 @@
+'''
+Benchmark `noj` startup time
+
+Usage: python scripts/bench_startup.py [-n RUNS] [--record FILE] [-- ARGS...]
+
+ARGS are passed to `python -m cli`, default to `--help`. With `--record`,
+the result is appended to FILE as a JSON line to track it over time.
+
+The short help of each lazily loaded command is checked against the
+command's docstring first, exit status is non-zero if they differ.
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import click
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def run(args, env, importtime=False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ['-X', 'importtime']
+    cmd += ['-m', 'cli', *args]
+    start = time.perf_counter()
+    proc = subprocess.run(
+        cmd,
+        env=env,
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return time.perf_counter() - start, proc.stderr
+
+
+def slowest_imports(stderr, top=10):
+    # Lines are in format: 'import time: self [us] | cumulative | name'
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def check_short_help():
+    '''
+    Return names of lazy commands whose short help differs from the loaded
+    command's
+    '''
+    from cli.command.noj import noj
+    ctx = click.Context(noj)
+    mismatches = []
+    for name, (_, short_help) in sorted(noj.lazy_commands.items()):
+        expected = noj.get_command(ctx, name).get_short_help_str()
+        if short_help != expected:
+            print(f'{name}: short help {short_help!r} != {expected!r}')
+            mismatches.append(name)
+    return mismatches
+
+
+def main():
+    if check_short_help():
+        exit(1)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--runs', type=int, default=20)
+    parser.add_argument('--record', type=Path)
+    parser.add_argument('args', nargs='*', default=['--help'])
+    opts = parser.parse_args()
+    with tempfile.TemporaryDirectory() as home:
+        # A dummy context so that config loading works
+        (Path(home) / '.config.json').write_text(
+            (ROOT / '.noj/.config.example.json').read_text())
+        env = {**os.environ, 'NOJ_HOME': home}
+        times = [run(opts.args, env)[0] for _ in range(opts.runs)]
+        _, stderr = run(opts.args, env, importtime=True)
+    result = {
+        'time': time.time(),
+        'args': opts.args,
+        'runs': opts.runs,
+        'min': min(times),
+        'median': statistics.median(times),
+    }
+    print(f'python -m cli {" ".join(opts.args)}')
+    print(f'min: {result["min"] * 1000:.1f}ms, '
+          f'median: {result["median"] * 1000:.1f}ms')
+    print('Slowest imports (cumulative):')
+    for us, name in slowest_imports(stderr):
+        print(f'{us / 1000:8.1f}ms  {name}')
+    if opts.record is not None:
+        with opts.record.open('a') as f:
+            f.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
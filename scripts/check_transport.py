@@ -0,0 +1,174 @@
+'''
+Check retry and timeout behaviour of the shared session against a local
+stub server which injects failures and latency
+
+Usage: python scripts/check_transport.py
+
+Exit status is non-zero if any check fails.
+'''
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import requests as rq
+from cli.core import auth
+from cli.core.config import Config
+
+# (method, path) -> [(status, headers, delay)], consumed in order, the last
+# one is repeated
+SCRIPTS = {}
+# (method, path) -> number of received requests
+HITS = defaultdict(int)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def handle_any(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        key = (method, self.path)
+        HITS[key] += 1
+        if self.path == '/auth/session':
+            status, headers, delay = 200, {'Set-Cookie': 'piann=ok'}, 0
+        else:
+            script = SCRIPTS.get(key, [(404, {}, 0)])
+            status, headers, delay = script[min(HITS[key], len(script)) - 1]
+        time.sleep(delay)
+        body = json.dumps({'data': {}}).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            # The client gave up waiting
+            pass
+
+    def do_GET(self):
+        self.handle_any('GET')
+
+    def do_POST(self):
+        self.handle_any('POST')
+
+
+def check(name, path, script, method='GET', expect=None, raises=None):
+    '''
+    Send one request through the session and compare the final status (or
+    exception) and the number of attempts with the expectation. Return the
+    elapsed time.
+    '''
+    expect_status, expect_attempts = expect
+    SCRIPTS[(method, path)] = script
+    start = time.perf_counter()
+    error = status = None
+    try:
+        status = auth.logined_session().request(
+            method,
+            f'{Config.API_BASE}{path}',
+        ).status_code
+    except Exception as e:
+        error = e
+    elapsed = time.perf_counter() - start
+    attempts = HITS[(method, path)]
+    got = repr(error) if error is not None else status
+    if raises is not None:
+        ok = isinstance(error, raises)
+    else:
+        ok = error is None and status == expect_status
+    ok = ok and attempts == expect_attempts
+    print(f'{"ok  " if ok else "FAIL"} {name}: got {got} after {attempts} '
+          f'attempts in {elapsed:.2f}s')
+    return ok, elapsed
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory() as home:
+        os.environ['NOJ_HOME'] = home
+        Config.API_BASE = f'http://127.0.0.1:{server.server_port}'
+        Config.curr_user = {'username': 'stub', 'password': 'stub'}
+        Config.TIMEOUT = (1, 0.3)
+        Config.MAX_RETRIES = 3
+        # Keep jittered backoff short so that Retry-After is measurable
+        auth.RETRY_BACKOFF = 0.01
+        results = [
+            check(
+                'GET retried on 503',
+                '/503',
+                [(503, {}, 0), (503, {}, 0), (200, {}, 0)],
+                expect=(200, 3),
+            ),
+            check(
+                'GET gives up after MAX_RETRIES',
+                '/always-503',
+                [(503, {}, 0)],
+                expect=(503, 4),
+            ),
+            check(
+                'POST not retried on 5xx',
+                '/post-503',
+                [(503, {}, 0), (200, {}, 0)],
+                method='POST',
+                expect=(503, 1),
+            ),
+            check(
+                'POST retried on 429',
+                '/post-429',
+                [(429, {}, 0), (200, {}, 0)],
+                method='POST',
+                expect=(200, 2),
+            ),
+            check(
+                'GET read timeout retried',
+                '/slow-once',
+                [(200, {}, 1), (200, {}, 0)],
+                expect=(200, 2),
+            ),
+            check(
+                'POST read timeout not retried',
+                '/post-slow',
+                [(200, {}, 1)],
+                method='POST',
+                expect=(None, 1),
+                raises=rq.ReadTimeout,
+            ),
+        ]
+        retry_after = {'Retry-After': '1'}
+        ok, elapsed = check(
+            'Retry-After honoured',
+            '/429-retry-after',
+            [(429, retry_after, 0), (200, {}, 0)],
+            expect=(200, 2),
+        )
+        if elapsed < 0.9:
+            print(f'FAIL Retry-After honoured: waited {elapsed:.2f}s < 1s')
+            ok = False
+        results.append((ok, elapsed))
+        auth.close_session()
+    server.shutdown()
+    failed = sum(not ok for ok, _ in results)
+    print(f'{len(results) - failed} passed, {failed} failed')
+    if failed:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()